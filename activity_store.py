@@ -0,0 +1,334 @@
+import contextlib
+import datetime
+import json
+import os
+from category_registry import CategoryRegistry, registry_path_for, resolve_totals
+from log_reader import DEFAULT_SLACK, iter_sessions
+from profiling import span
+from segments import SegmentSet, archived_totals
+from stats_index import open_index, query_totals, update_index
+
+JOURNAL_FILE = "activity_log.jsonl"
+CSV_FILE = "activity_log.csv"
+LOCK_SUFFIX = ".lock"
+
+# Every store offers the same small interface:
+#   append(activity)  -- activity is a dict with ISO 'start_time'/'end_time'
+#                        strings and an 'activity' name
+#   append_many(activities) -- several such dicts in one write (see
+#                        batch_writer.py); BinaryStore takes tuples instead
+#   load()            -- all activities as such dicts
+#   totals(days)      -- hours per activity over the last `days` calendar days
+#   version()         -- cheap token that changes whenever the data changes
+#   columns(since)    -- analytics.SessionColumns of sessions overlapping the
+#                        window starting at the datetime since (None = all)
+#
+# The CSV log and the journal may have closed periods archived into segments
+# (see segments.py); totals() and columns() include those, load() does not.
+# Each log has a category registry next to it (see category_registry.py);
+# totals() and columns() report categories under its display names, so
+# renames and merges apply to the whole history.
+
+
+def window_bounds(days, today=None):
+    """Return (first_day, today, start, end) of the last `days` calendar days."""
+    if today is None:
+        today = datetime.date.today()
+    first_day = today - datetime.timedelta(days=days - 1)
+    start = datetime.datetime.combine(first_day, datetime.time())
+    end = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+    return first_day, today, start, end
+
+
+def add_totals(total_time, extra):
+    for activity, hours in extra.items():
+        total_time[activity] = total_time.get(activity, 0) + hours
+    return total_time
+
+
+def with_segments(log_path, columns, since=None):
+    """Prepend the archived sessions overlapping the window to hot-log columns."""
+    segments = SegmentSet(log_path)
+    if not segments:
+        return columns
+    from analytics import concat_columns, to_epoch
+    parts = segments.columns(to_epoch(since) if since else None)
+    return concat_columns(parts + [columns], columns.offset) if parts else columns
+
+
+def file_version(path):
+    """Size and mtime of a log file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def with_registry(registry, columns):
+    from analytics import relabel
+    registry.refresh()
+    return relabel(columns, registry)
+
+
+@contextlib.contextmanager
+def log_lock(path, exclusive=False):
+    """Hold the lock of a log: shared while appending, exclusive while rewriting it.
+
+    Compaction and archiving replace the log with a new file, so the lock is
+    taken on a sidecar file that is never replaced. Where flock is not
+    available this does nothing.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path + LOCK_SUFFIX, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+class ActivityJournal:
+    """Append-only activity log with one JSON record per line.
+
+    Every append is a single write + fsync on a file opened with O_APPEND, so
+    saving costs the same no matter how long the history is. A crash in the
+    middle of an append can only leave a torn last line, which is cut off the
+    next time the journal is opened. Records hold the category id from the
+    journal's registry rather than its name; records written with an
+    'activity' name are still read.
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.registry = CategoryRegistry(registry_path_for(path))
+        self.recover()
+
+    def recover(self):
+        """Truncate a partially written trailing record, if any."""
+        if self._ends_with_newline():
+            return
+        # Appends in flight finish first, so only a really torn record is cut
+        with log_lock(self.path, exclusive=True):
+            try:
+                f = open(self.path, "r+b")
+            except FileNotFoundError:
+                return
+            with f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                # Walk backwards to the last complete line
+                pos = size
+                block = 4096
+                while pos > 0:
+                    read_from = max(0, pos - block)
+                    f.seek(read_from)
+                    chunk = f.read(pos - read_from)
+                    newline = chunk.rfind(b"\n")
+                    if newline != -1:
+                        pos = read_from + newline + 1
+                        break
+                    pos = read_from
+                f.truncate(pos)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _ends_with_newline(self):
+        try:
+            with open(self.path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return True
+                f.seek(size - 1)
+                return f.read(1) == b"\n"
+        except FileNotFoundError:
+            return True
+
+    def append(self, activity):
+        """Durably append a single activity record."""
+        self.append_many([activity])
+
+    def append_many(self, activities, sync=True):
+        """Append several records with one write and, if sync, one fsync."""
+        data = "".join(
+            json.dumps({"start_time": a['start_time'], "end_time": a['end_time'],
+                        "category": self.registry.intern(a['activity'])},
+                       separators=(",", ":")) + "\n"
+            for a in activities).encode("utf-8")
+        with span("write.journal", bytes=len(data), records=len(activities)), log_lock(self.path):
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                if sync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        update_index(self.path)
+
+    def __iter__(self):
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        self.registry.refresh()
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from another process, ignore it
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    if 'category' in record:
+                        record['activity'] = self.registry.name(record.pop('category'))
+                except (ValueError, IndexError, TypeError):
+                    continue
+                yield record
+
+    def load(self):
+        """Return all activities as a list of dicts."""
+        return list(self)
+
+    def totals(self, days, today=None):
+        _, today, start, end = window_bounds(days, today)
+        self.registry.refresh()
+        return resolve_totals(add_totals(query_totals(self.path, days, today),
+                                         archived_totals(self.path, start, end)), self.registry)
+
+    def columns(self, since=None):
+        from analytics import load_columns
+        return with_registry(self.registry, with_segments(self.path, load_columns(self.path), since))
+
+    def version(self):
+        return file_version(self.path), self.registry.version()
+
+
+class CsvLog:
+    """The 'start,end,activity' CSV log written by the command-line timer."""
+
+    def __init__(self, path=CSV_FILE):
+        self.path = path
+        self.registry = CategoryRegistry(registry_path_for(path))
+
+    def append(self, activity):
+        start = datetime.datetime.fromisoformat(activity['start_time'])
+        end = datetime.datetime.fromisoformat(activity['end_time'])
+        line = f"{start.strftime('%Y-%m-%d %H:%M:%S')},{end.strftime('%Y-%m-%d %H:%M:%S')},{activity['activity']}\n"
+        with span("write.csv", bytes=len(line), records=1), log_lock(self.path), \
+                open(self.path, "a") as f:
+            f.write(line)
+        update_index(self.path)
+
+    def append_many(self, activities, sync=True):
+        """Append several sessions with one write and, if sync, one fsync."""
+        lines = []
+        for activity in activities:
+            start = datetime.datetime.fromisoformat(activity['start_time'])
+            end = datetime.datetime.fromisoformat(activity['end_time'])
+            lines.append(f"{start.strftime('%Y-%m-%d %H:%M:%S')},{end.strftime('%Y-%m-%d %H:%M:%S')},"
+                         f"{activity['activity']}\n")
+        data = "".join(lines)
+        with span("write.csv", bytes=len(data), records=len(lines)), log_lock(self.path), \
+                open(self.path, "a") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        update_index(self.path)
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+        for start, end, activity in iter_sessions(self.path):
+            yield {
+                "start_time": start.isoformat(),
+                "end_time": end.isoformat(),
+                "activity": activity
+            }
+
+    def load(self):
+        return list(self)
+
+    def version(self):
+        return file_version(self.path), self.registry.version()
+
+    def columns(self, since=None):
+        from analytics import load_csv_columns
+        columns = load_csv_columns(self.path, since - DEFAULT_SLACK if since else None)
+        return with_registry(self.registry, with_segments(self.path, columns, since))
+
+    def totals(self, days, today=None):
+        """Hours per activity from the rollup index.
+
+        If the index no longer matches the log, only the window is streamed
+        from the tail of the log instead of rebuilding the index first; run
+        'python stats_index.py rebuild' to fix the index itself.
+        """
+        first_day, today, start_date, end_date = window_bounds(days, today)
+        archived = archived_totals(self.path, start_date, end_date)
+        self.registry.refresh()
+        index = open_index(self.path)
+        index.sync()
+        if index.is_consistent():
+            index.refresh()
+            return resolve_totals(add_totals(index.totals(first_day, today), archived), self.registry)
+
+        from analytics import load_csv_columns, to_epoch
+        columns = load_csv_columns(self.path, since=start_date - DEFAULT_SLACK)
+        return resolve_totals(add_totals(columns.totals(to_epoch(start_date), to_epoch(end_date)),
+                                         archived), self.registry)
+
+
+def migrate_json_log(json_path, journal_path=JOURNAL_FILE):
+    """One-time conversion of a JSON array log into a journal.
+
+    The journal is written to a temporary file and renamed into place, so an
+    interrupted migration never leaves a half-filled journal behind. Returns
+    the number of migrated records.
+    """
+    with open(json_path, "r") as f:
+        activities = json.load(f)
+
+    tmp_path = journal_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for activity in activities:
+            f.write(json.dumps(activity, separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, journal_path)
+    return len(activities)
+
+
+def open_journal(journal_path=JOURNAL_FILE, legacy_json_path="activity_log.json"):
+    """Open the journal, migrating the legacy JSON log on first use."""
+    if not os.path.exists(journal_path) and os.path.exists(legacy_json_path):
+        migrate_json_log(legacy_json_path, journal_path)
+    return ActivityJournal(journal_path)
+
+
+def open_store(path):
+    """Open the store matching a path's extension (.db/.sqlite, .bin, .csv or journal)."""
+    if path.endswith((".db", ".sqlite")):
+        from sqlite_store import SQLiteStore
+        return SQLiteStore(path)
+    if path.endswith(".bin"):
+        from binary_store import BinaryStore
+        return BinaryStore(path)
+    if path.endswith(".csv"):
+        return CsvLog(path)
+    return ActivityJournal(path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "activity_log.json"
+    target = sys.argv[2] if len(sys.argv) > 2 else JOURNAL_FILE
+    count = migrate_json_log(source, target)
+    print(f"Migrated {count} activities from {source} to {target}")
@@ -0,0 +1,387 @@
+import json
+import os
+import numpy as np
+from category_registry import CategoryRegistry, registry_path_for
+from log_reader import find_window_offset
+from profiling import span, traced
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+class SessionColumns:
+    """Activity log held as typed columns.
+
+    start and end are int64 seconds since the epoch of the naive (local)
+    timestamps, so integer division by 86400 gives the calendar day. codes
+    indexes into categories.
+    """
+
+    def __init__(self, start, end, codes, categories, offset=0):
+        self.start = start
+        self.end = end
+        self.codes = codes
+        self.categories = categories
+        self.offset = offset  # bytes of the log consumed while loading
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def durations(self):
+        return self.end - self.start
+
+    @traced("aggregate.totals")
+    def totals(self, since=None, until=None):
+        """Return hours per activity within [since, until), given as epoch seconds.
+
+        Sessions are clipped to the window, so only the overlapping part of a
+        session that crosses either edge is counted.
+        """
+        start, end, codes = _clip(self, since, until)
+        seconds = np.bincount(codes, weights=end - start, minlength=len(self.categories))
+        return {self.categories[i]: float(seconds[i]) / 3600
+                for i in np.flatnonzero(seconds)}
+
+    def interval_index(self):
+        return IntervalIndex(self)
+
+    def daily_seconds(self):
+        """Return (first_day, matrix) with seconds per (day, category).
+
+        Sessions crossing midnight are split so each day only gets its part.
+        first_day is the epoch day number of row 0.
+        """
+        n_categories = len(self.categories)
+        if len(self) == 0:
+            return 0, np.zeros((0, n_categories))
+        keep = self.end > self.start
+        start, end, codes = self.start[keep], self.end[keep], self.codes[keep]
+        if len(start) == 0:
+            return 0, np.zeros((0, n_categories))
+        first_day = int(start.min() // SECONDS_PER_DAY)
+        n_days = int((end.max() - 1) // SECONDS_PER_DAY) - first_day + 1
+        flat = np.zeros(n_days * n_categories)
+        while len(start):
+            day = start // SECONDS_PER_DAY
+            chunk_end = np.minimum(end, (day + 1) * SECONDS_PER_DAY)
+            keys = (day - first_day) * n_categories + codes
+            flat += np.bincount(keys, weights=chunk_end - start,
+                                minlength=len(flat))
+            # Only sessions that ran past midnight need another pass
+            rest = chunk_end < end
+            start, end, codes = chunk_end[rest], end[rest], codes[rest]
+        return first_day, flat.reshape(n_days, n_categories)
+
+
+class Histograms:
+    """Time-bucketed views of a log, all filled by SessionColumns.histograms.
+
+    heatmap[c, weekday, hour] holds seconds of category c in that hour of the
+    week (Monday = 0). daily[d, c] and weekly[w, c] are seconds per day and per
+    Monday-based week, starting at epoch day first_day and epoch week
+    first_week respectively.
+    """
+
+    def __init__(self, categories, first_day, n_days):
+        n_categories = len(categories)
+        self.categories = categories
+        self.first_day = first_day
+        self.first_week = (first_day + 3) // 7
+        n_weeks = (first_day + n_days - 1 + 3) // 7 - self.first_week + 1 if n_days else 0
+        self.heatmap = np.zeros((n_categories, 7, 24))
+        self.daily = np.zeros((n_days, n_categories))
+        self.weekly = np.zeros((n_weeks, n_categories))
+
+    def days(self):
+        """The calendar dates of the rows of daily."""
+        epoch = np.datetime64("1970-01-01", "D")
+        return (epoch + np.arange(self.first_day, self.first_day + len(self.daily))).astype(object)
+
+    def weeks(self):
+        """The Monday starting each row of weekly."""
+        epoch = np.datetime64("1970-01-01", "D")
+        mondays = np.arange(self.first_week, self.first_week + len(self.weekly)) * 7 - 3
+        return (epoch + mondays).astype(object)
+
+
+class IntervalIndex:
+    """Sessions sorted by start, for clipped range sums without a full scan.
+
+    Alongside the sorted starts it keeps the running maximum of the ends and
+    per-category prefix sums of durations. A window query sums the sessions
+    starting inside it from the prefix sums in O(categories * log n), then
+    corrects only the sessions that cross an edge: those before the window
+    whose end reaches into it (found through the running max end) and those
+    near the right edge that run past it (bounded by the longest session).
+    """
+
+    def __init__(self, columns):
+        start, end = np.asarray(columns.start), np.asarray(columns.end)
+        # Reversed and empty sessions count for nothing, as in SessionColumns.totals
+        keep = end > start
+        order = np.argsort(start[keep], kind="stable")
+        self.start = start[keep][order]
+        self.end = end[keep][order]
+        self.codes = np.asarray(columns.codes)[keep][order]
+        self.categories = columns.categories
+        self.max_end = np.maximum.accumulate(self.end) if len(self.end) else self.end
+        durations = self.end - self.start
+        self.max_duration = int(durations.max()) if len(durations) else 0
+        self.positions = []
+        self.prefix = []
+        for code in range(len(self.categories)):
+            positions = np.flatnonzero(self.codes == code)
+            self.positions.append(positions)
+            self.prefix.append(np.concatenate(([0], np.cumsum(durations[positions]))))
+
+    def seconds(self, since, until):
+        """Return clipped seconds per category code for [since, until)."""
+        totals = np.zeros(len(self.categories))
+        lo = int(np.searchsorted(self.start, since, side="left"))
+        hi = int(np.searchsorted(self.start, until, side="left"))
+        for code, (positions, prefix) in enumerate(zip(self.positions, self.prefix)):
+            first, last = np.searchsorted(positions, (lo, hi))
+            totals[code] = prefix[last] - prefix[first]
+
+        # Sessions starting in the window but ending after it
+        right = max(lo, int(np.searchsorted(self.start, until - self.max_duration, side="left")))
+        overshoot = self.end[right:hi] - until
+        past = overshoot > 0
+        totals -= np.bincount(self.codes[right:hi][past], weights=overshoot[past],
+                              minlength=len(totals))
+
+        # Sessions starting before the window but still running inside it
+        left = int(np.searchsorted(self.max_end, since, side="right"))
+        if left < lo:
+            start = np.full(lo - left, since)
+            end = np.minimum(self.end[left:lo], until)
+            inside = end > start
+            totals += np.bincount(self.codes[left:lo][inside], weights=(end - start)[inside],
+                                  minlength=len(totals))
+        return totals
+
+    @traced("aggregate.interval_totals")
+    def totals(self, since, until):
+        """Return clipped hours per activity for [since, until)."""
+        seconds = self.seconds(since, until)
+        return {self.categories[i]: float(seconds[i]) / 3600
+                for i in np.flatnonzero(seconds)}
+
+
+def _clip(columns, since, until):
+    start, end, codes = columns.start, columns.end, columns.codes
+    if since is not None:
+        start = np.maximum(start, since)
+    if until is not None:
+        end = np.minimum(end, until)
+    keep = end > start
+    return start[keep], end[keep], codes[keep]
+
+
+@traced("aggregate.histograms")
+def histograms(columns, since=None, until=None):
+    """Fill every Histograms view in a single pass over the sessions.
+
+    Sessions are clipped to [since, until) (epoch seconds) and cut at hour
+    boundaries; each pass handles one hour of every still-open session, so
+    the number of passes is the length of the longest session in hours.
+    """
+    start, end, codes = _clip(columns, since, until)
+    n_categories = len(columns.categories)
+    if len(start) == 0:
+        return Histograms(columns.categories, 0, 0)
+    first_day = int(start.min() // SECONDS_PER_DAY)
+    n_days = int((end.max() - 1) // SECONDS_PER_DAY) - first_day + 1
+    result = Histograms(columns.categories, first_day, n_days)
+    heatmap = result.heatmap.reshape(-1)
+    daily = result.daily.reshape(-1)
+    weekly = result.weekly.reshape(-1)
+    while len(start):
+        hour = start // SECONDS_PER_HOUR
+        chunk_end = np.minimum(end, (hour + 1) * SECONDS_PER_HOUR)
+        seconds = chunk_end - start
+        day = hour // 24
+        weekday = (day + 3) % 7  # 1970-01-01 was a Thursday
+        week = (day + 3) // 7
+        heatmap += np.bincount((codes * 7 + weekday) * 24 + hour % 24,
+                               weights=seconds, minlength=len(heatmap))
+        daily += np.bincount((day - first_day) * n_categories + codes,
+                             weights=seconds, minlength=len(daily))
+        weekly += np.bincount((week - result.first_week) * n_categories + codes,
+                              weights=seconds, minlength=len(weekly))
+        rest = chunk_end < end
+        start, end, codes = chunk_end[rest], end[rest], codes[rest]
+    return result
+
+
+@traced("aggregate.daily_buckets", lambda buckets: {"records": len(buckets)})
+def daily_buckets(columns):
+    """Return {(epoch day number, category): seconds} for non-empty buckets."""
+    first_day, matrix = columns.daily_seconds()
+    return {(first_day + int(row), columns.categories[col]): float(matrix[row, col])
+            for row, col in zip(*matrix.nonzero())}
+
+
+def to_epoch(dt):
+    """Convert a naive datetime to the epoch seconds used by SessionColumns."""
+    return int(np.datetime64(dt, "s").astype(np.int64))
+
+
+def concat_columns(parts, offset=0):
+    """Join several SessionColumns into one, merging their category lists."""
+    if len(parts) == 1:
+        return parts[0]
+    categories = sorted({name for part in parts for name in part.categories})
+    ids = {name: i for i, name in enumerate(categories)}
+    codes = [np.array([ids[name] for name in part.categories], dtype=np.int32)[part.codes]
+             if len(part) else np.zeros(0, dtype=np.int32) for part in parts]
+    return SessionColumns(np.concatenate([np.asarray(p.start, dtype=np.int64) for p in parts]),
+                          np.concatenate([np.asarray(p.end, dtype=np.int64) for p in parts]),
+                          np.concatenate(codes), categories, offset)
+
+
+def relabel(columns, registry):
+    """Show columns under the registry's display names, folding merged categories.
+
+    Only the category list is looked up; codes are translated with one
+    indexing step, and only if some name actually changed.
+    """
+    names = [registry.display(name) for name in columns.categories]
+    if names == list(columns.categories):
+        return columns
+    categories = sorted(set(names))
+    ids = {name: i for i, name in enumerate(categories)}
+    remap = np.array([ids[name] for name in names], dtype=np.int32)
+    return SessionColumns(columns.start, columns.end, remap[columns.codes], categories,
+                          columns.offset)
+
+
+@traced("parse.columns", lambda columns: {"records": len(columns)})
+def _build_columns(starts, ends, names, offset):
+    start = np.array(starts, dtype="datetime64[s]").astype(np.int64)
+    end = np.array(ends, dtype="datetime64[s]").astype(np.int64)
+    categories, codes = np.unique(np.array(names, dtype=str), return_inverse=True)
+    return SessionColumns(start, end, codes.astype(np.int32),
+                          [str(c) for c in categories], offset)
+
+
+@traced("parse.columns", lambda columns: {"records": len(columns)})
+def _build_coded_columns(starts, ends, codes, categories, offset):
+    start = np.array(starts, dtype="datetime64[s]").astype(np.int64)
+    end = np.array(ends, dtype="datetime64[s]").astype(np.int64)
+    return SessionColumns(start, end, np.array(codes, dtype=np.int32), categories, offset)
+
+
+def load_csv_columns(path, since=None, byte_range=None):
+    """Load a CSV log into columns.
+
+    When since (a datetime) is given, only the tail of the time-ordered log
+    from the first session starting at or after since is read. byte_range
+    restricts loading to the lines starting in [start, end), which must be
+    line-aligned.
+    """
+    starts, ends, names = [], [], []
+    stop = None
+    with open(path, "rb") as f, span("load.csv", path=path) as s:
+        if since is not None:
+            f.seek(find_window_offset(f, since))
+        if byte_range is not None:
+            f.seek(byte_range[0])
+            stop = byte_range[1]
+        offset = first = f.tell()
+        for line in f:
+            if not line.endswith(b"\n") or (stop is not None and offset >= stop):
+                break
+            offset += len(line)
+            parts = line.decode("utf-8", "replace").strip().split(",")
+            if len(parts) != 3 or len(parts[0]) != 19 or len(parts[1]) != 19:
+                continue
+            starts.append(parts[0])
+            ends.append(parts[1])
+            names.append(parts[2])
+        s.set(bytes=offset - first, records=len(starts))
+    try:
+        return _build_columns(starts, ends, names, offset)
+    except ValueError:
+        # A malformed timestamp slipped through, drop rows one by one
+        good = [i for i in range(len(starts)) if _valid(starts[i]) and _valid(ends[i])]
+        return _build_columns([starts[i] for i in good], [ends[i] for i in good],
+                              [names[i] for i in good], offset)
+
+
+@traced("load.journal", lambda columns: {"bytes": columns.offset, "records": len(columns)})
+def load_journal_columns(path):
+    """Load a JSON-lines activity journal into columns.
+
+    Records holding a category id are coded straight from the journal's
+    registry; records holding a name (written before the registry, or by the
+    importer) are looked up in it, or get a code of their own if unknown.
+    """
+    registry = CategoryRegistry(registry_path_for(path))
+    remap = registry.remap()
+    extra = {}  # names missing from the registry -> code
+    starts, ends, codes = [], [], []
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+                start, end = record['start_time'], record['end_time']
+                if 'category' in record:
+                    code = remap[record['category']]
+                else:
+                    name = record['activity']
+                    code = registry.lookup(name)
+                    if code is None:
+                        code = extra.setdefault(name, len(remap) + len(extra))
+            except (ValueError, KeyError, TypeError, IndexError):
+                continue
+            if _valid(start) and _valid(end):
+                starts.append(start)
+                ends.append(end)
+                codes.append(code)
+    return _build_coded_columns(starts, ends, codes, registry.labels() + list(extra), offset)
+
+
+@traced("load.json", lambda columns: {"bytes": columns.offset, "records": len(columns)})
+def load_json_array_columns(path):
+    """Load a legacy activity_log.json (one JSON array) into columns."""
+    with open(path, "r") as f:
+        activities = json.load(f)
+    starts, ends, names = [], [], []
+    for activity in activities:
+        try:
+            start, end, name = activity['start_time'], activity['end_time'], activity['activity']
+        except (KeyError, TypeError):
+            continue
+        if _valid(start) and _valid(end):
+            starts.append(start)
+            ends.append(end)
+            names.append(name)
+    return _build_columns(starts, ends, names, os.path.getsize(path))
+
+
+def load_columns(path, since=None):
+    """Load any of the log formats into columns, named as in the log's registry."""
+    if path.endswith(".csv"):
+        columns = load_csv_columns(path, since)
+    elif path.endswith(".json"):
+        columns = load_json_array_columns(path)
+    else:
+        return load_journal_columns(path)
+    registry_path = registry_path_for(path)
+    if not os.path.exists(registry_path):
+        return columns
+    return relabel(columns, CategoryRegistry(registry_path))
+
+
+def _valid(text):
+    try:
+        np.datetime64(text, "s")
+    except (ValueError, TypeError):
+        return False
+    return True
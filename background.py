@@ -0,0 +1,34 @@
+import queue
+import threading
+
+
+class BackgroundTask:
+    """Run a function on a worker thread and hand its result back to Tk.
+
+    The function is called as func(*args, cancelled=event) and should check
+    the event between expensive steps. The Tk side never blocks: it calls
+    poll() from root.after() until the task is done.
+    """
+
+    def __init__(self, func, *args):
+        self.cancelled = threading.Event()
+        self._results = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, args=(func, args), daemon=True)
+        self._thread.start()
+
+    def _run(self, func, args):
+        try:
+            self._results.put((func(*args, cancelled=self.cancelled), None))
+        except Exception as e:
+            self._results.put((None, e))
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def poll(self):
+        """Return (done, result, error) without blocking."""
+        try:
+            result, error = self._results.get_nowait()
+        except queue.Empty:
+            return False, None, None
+        return True, result, error
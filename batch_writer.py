@@ -0,0 +1,182 @@
+import atexit
+import os
+import threading
+import time
+from profiling import span
+
+DURABILITY_ENV = "ACTIVITY_DURABILITY"
+DEFAULT_MAX_RECORDS = 1000
+DEFAULT_MAX_DELAY = 0.01  # seconds a record may wait for its batch to fill
+
+# sync  -- append() returns once the record's batch is written and fsync'd
+# batch -- append() returns at once; every batch is fsync'd when written, so a
+#          crash loses at most the records of the last max_delay
+# os    -- batches are written without fsync and the OS decides when they
+#          reach the disk
+DURABILITY_MODES = ("sync", "batch", "os")
+
+
+class BatchWriter:
+    """Queue activity records and commit them to a store in batches.
+
+    A writer thread collects records until max_records are queued or the
+    oldest has waited max_delay seconds, then writes the whole batch with one
+    append and at most one fsync. In sync mode a batch is written as soon as
+    the previous one is done, since callers are waiting on it: records that
+    arrive during one fsync share the next (group commit) instead of paying
+    one each. Queued records are flushed when the writer is closed and at
+    interpreter exit.
+
+    In batch and os mode nobody waits for a write, so a failed batch is kept
+    and retried; if on_error is given, it is called with the batch and the
+    error instead, and the batch is handed over to it.
+    """
+
+    def __init__(self, store, max_records=DEFAULT_MAX_RECORDS, max_delay=DEFAULT_MAX_DELAY,
+                 durability=None, on_error=None):
+        durability = durability or os.environ.get(DURABILITY_ENV, "sync")
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_MODES)}")
+        self.store = store
+        self.max_records = max_records
+        self.max_delay = max_delay
+        self.durability = durability
+        self.on_error = on_error
+        self.batches = 0
+        self._queue = []
+        self._oldest = None       # monotonic time the oldest queued record arrived
+        self._queued = 0          # sequence number of the last queued record
+        self._committed = 0       # sequence number of the last committed record
+        self._flush_upto = 0
+        self._failures = []       # (first, last, exception) of failed sync batches
+        self._error = None        # failure of an async batch, raised to the next caller
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, activity):
+        """Queue one activity dict; in sync mode, wait until it is durable."""
+        with self._cond:
+            self._raise_error()
+            if self._closed:
+                raise ValueError("writer is closed")
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.append(activity)
+            self._queued += 1
+            seq = self._queued
+            if len(self._queue) == 1 or len(self._queue) >= self.max_records:
+                self._cond.notify_all()
+            if self.durability == "sync":
+                self._wait_for(seq)
+
+    def flush(self):
+        """Commit everything queued so far and wait for it."""
+        with self._cond:
+            self._flush_upto = self._queued
+            self._cond.notify_all()
+            self._wait_for(self._queued)
+            self._raise_error()
+
+    def close(self):
+        """Flush the queue and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+        with self._cond:
+            self._raise_error()
+
+    def _wait_for(self, seq):
+        while True:
+            for first, last, error in self._failures:
+                if first <= seq <= last:
+                    raise error
+            self._raise_error()
+            if self._committed >= seq:
+                return
+            if not self._thread.is_alive():
+                raise RuntimeError("batch writer thread stopped")
+            self._cond.wait(1)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _next_batch(self):
+        """Wait until a batch is due; return (batch, first seq), or None to stop."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            deadline = self._oldest + self.max_delay
+            while (self.durability != "sync" and len(self._queue) < self.max_records
+                   and not self._closed
+                   and self._flush_upto <= self._committed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_records]
+            del self._queue[:self.max_records]
+            self._oldest = time.monotonic() if self._queue else None
+            return batch, self._committed + 1
+
+    def _run(self):
+        while True:
+            due = self._next_batch()
+            if due is None:
+                return
+            batch, first = due
+            try:
+                with span("write.batch", records=len(batch)):
+                    self._write(batch)
+            except Exception as e:
+                if self.durability != "sync" and self.on_error is not None:
+                    try:
+                        self.on_error(batch, e)
+                    except Exception:
+                        pass  # keep the records and retry, as without a handler
+                    else:
+                        with self._cond:
+                            self._committed += len(batch)
+                            self._cond.notify_all()
+                        continue
+                with self._cond:
+                    if self.durability == "sync":
+                        # The waiting callers get the error and the batch is dropped
+                        self._failures = self._failures[-15:] + [(first, first + len(batch) - 1, e)]
+                        self._committed += len(batch)
+                    else:
+                        # Nobody is waiting: keep the records and retry later
+                        self._queue[:0] = batch
+                        self._oldest = time.monotonic()
+                        self._error = e
+                        if self._closed:
+                            return
+                    self._cond.notify_all()
+                    self._cond.wait(self.max_delay)
+                continue
+            with self._cond:
+                self._committed += len(batch)
+                self.batches += 1
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        from activity_store import ActivityJournal, CsvLog
+        if isinstance(self.store, (ActivityJournal, CsvLog)):
+            self.store.append_many(batch, sync=self.durability != "os")
+        elif self.store.path.endswith(".bin"):
+            import datetime
+            self.store.append_many((datetime.datetime.fromisoformat(a['start_time']),
+                                    datetime.datetime.fromisoformat(a['end_time']),
+                                    a['activity']) for a in batch)
+        else:
+            self.store.append_many(batch)
@@ -0,0 +1,81 @@
+"""Compare the columnar stats engine against the original per-line loop.
+
+Usage: python benchmarks/bench_analytics.py [rows ...]   (default: 1000000 10000000)
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analytics import load_csv_columns, to_epoch
+
+
+def write_log(path, rows):
+    rng = random.Random(42)
+    categories = ["Sleeping", "Coding", "Training", "Other"]
+    t = datetime.datetime(2020, 1, 1)
+    with open(path, "w") as f:
+        for _ in range(rows):
+            end = t + datetime.timedelta(seconds=rng.randint(60, 7200))
+            f.write(f"{t:%Y-%m-%d %H:%M:%S},{end:%Y-%m-%d %H:%M:%S},{rng.choice(categories)}\n")
+            t = end + datetime.timedelta(seconds=rng.randint(0, 600))
+    return t
+
+
+def loop_totals(path, start_date, end_date):
+    """The per-line loop grok3_timer.get_stats used before the columnar engine.
+
+    Sessions are clipped to the window as SessionColumns.totals does, so both
+    count the same seconds.
+    """
+    total_time = {}
+    with open(path, "r") as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) != 3:
+                continue
+            start_str, end_str, activity = parts
+            try:
+                start = datetime.datetime.strptime(start_str, "%Y-%m-%d %H:%M:%S")
+                end = datetime.datetime.strptime(end_str, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                continue
+            start, end = max(start, start_date), min(end, end_date)
+            if end > start:
+                duration = (end - start).total_seconds() / 3600
+                total_time[activity] = total_time.get(activity, 0) + duration
+    return total_time
+
+
+def columnar_totals(path, start_date, end_date):
+    columns = load_csv_columns(path)
+    return columns.totals(to_epoch(start_date), to_epoch(end_date))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f"log_{rows}.csv")
+            last = write_log(path, rows)
+            start_date = last - datetime.timedelta(days=365)
+            loop_time, expected = timed(loop_totals, path, start_date, last)
+            columnar_time, result = timed(columnar_totals, path, start_date, last)
+            assert expected.keys() == result.keys()
+            assert all(abs(expected[k] - result[k]) < 1e-6 for k in expected)
+            print(f"{rows:>10} rows  loop {loop_time:8.2f}s  columnar {columnar_time:8.2f}s  "
+                  f"speedup {loop_time / columnar_time:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Measure records/sec against append latency for batched, group-committed writes.
+
+Usage: python benchmarks/bench_batching.py [records] [threads]   (default: 5000 8)
+
+Compares one store.append per record with BatchWriter in each durability
+mode, for several batch sizes, on a CSV log and a journal. Latency is the
+time an append call takes to return: in sync mode that includes the fsync of
+its batch, in the other modes only the hand-off to the writer thread.
+"""
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from activity_store import open_store
+from batch_writer import DURABILITY_MODES, BatchWriter
+
+BATCH_SIZES = [10, 100, 1000]
+FORMATS = [".csv", ".jsonl"]
+
+
+def activities(count, offset):
+    t = datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=offset)
+    for i in range(count):
+        start = t + datetime.timedelta(minutes=10 * i)
+        yield {"start_time": start.isoformat(),
+               "end_time": (start + datetime.timedelta(minutes=5)).isoformat(),
+               "activity": "Coding"}
+
+
+def run(append, records, threads):
+    """Append records split over threads; return (records/sec, p50 ms, p99 ms)."""
+    latencies = [[] for _ in range(threads)]
+
+    def worker(n):
+        for activity in activities(records // threads, n * 1000):
+            started = time.perf_counter()
+            append(activity)
+            latencies[n].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    all_latencies = sorted(x for part in latencies for x in part)
+    p99 = all_latencies[int(len(all_latencies) * 0.99) - 1]
+    return len(all_latencies) / elapsed, statistics.median(all_latencies), p99, elapsed
+
+
+def report(name, records_per_sec, p50, p99, batches=None):
+    print(f"  {name:<28} {records_per_sec:>10,.0f} records/sec   "
+          f"append p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+          + (f"  {batches} batches" if batches is not None else ""))
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    with tempfile.TemporaryDirectory() as tmp:
+        for extension in FORMATS:
+            print(f"{extension} log, {records} records from {threads} threads")
+            path = os.path.join(tmp, "direct" + extension)
+            store = open_store(path)
+            lock = threading.Lock()
+
+            def direct(activity):
+                with lock:
+                    store.append(activity)
+
+            report("store.append", *run(direct, records, threads)[:3])
+            for durability in DURABILITY_MODES:
+                for batch_size in BATCH_SIZES:
+                    path = os.path.join(tmp, f"{durability}_{batch_size}{extension}")
+                    writer = BatchWriter(open_store(path), max_records=batch_size,
+                                         durability=durability)
+                    rate, p50, p99, elapsed = run(writer.append, records, threads)
+                    started = time.perf_counter()
+                    writer.close()
+                    # Count the time to drain the queue for the async modes
+                    rate = records / (elapsed + time.perf_counter() - started)
+                    report(f"{durability} max_records={batch_size}", rate, p50, p99, writer.batches)
+
+
+if __name__ == "__main__":
+    main()
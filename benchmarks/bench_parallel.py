@@ -0,0 +1,40 @@
+"""Compare chunked parallel parsing of one CSV log across worker counts.
+
+Usage: python benchmarks/bench_parallel.py [rows]   (default: 20000000)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analytics import daily_buckets, load_csv_columns
+from bench_analytics import write_log
+from parallel_reader import parallel_daily_buckets
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "activity_log.csv")
+        write_log(path, rows)
+
+        started = time.perf_counter()
+        expected = daily_buckets(load_csv_columns(path))
+        serial = time.perf_counter() - started
+        print(f"{rows} rows, serial: {serial:.2f}s")
+
+        for workers in WORKER_COUNTS:
+            started = time.perf_counter()
+            records, _, buckets = parallel_daily_buckets(path, workers)
+            elapsed = time.perf_counter() - started
+            assert records == rows and buckets == expected
+            print(f"  {workers} workers: {elapsed:7.2f}s  speedup {serial / elapsed:4.1f}x  "
+                  f"{rows / elapsed:,.0f} records/sec")
+
+
+if __name__ == "__main__":
+    main()
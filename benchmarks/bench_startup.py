@@ -0,0 +1,48 @@
+"""Report cold-start import cost of both front-ends with python -X importtime.
+
+Usage: python benchmarks/bench_startup.py [budget_ms]   (default: 150)
+
+Exits with status 1 if either front-end takes longer than the budget to import.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODULES = ["grok3_timer", "cursor_timer"]
+HEAVY_MODULES = ["matplotlib", "numpy", "pandas"]
+
+
+def import_times(module):
+    """Return {module name: (self_us, cumulative_us)} for importing module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 150
+    failed = False
+    for module in MODULES:
+        times = import_times(module)
+        total_ms = times[module][1] / 1000
+        heavy = [name for name in HEAVY_MODULES if name in times]
+        print(f"{module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+        for name, (self_us, _) in sorted(times.items(), key=lambda t: -t[1][0])[:5]:
+            print(f"    {self_us / 1000:7.1f} ms  {name}")
+        if heavy:
+            print(f"    heavy modules imported at startup: {', '.join(heavy)}")
+        if total_ms > budget_ms or heavy:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure timer tick drift, jitter and wakeups for the GUI tick strategies.
+
+Usage: python benchmarks/bench_tick.py [seconds] [focused|unfocused|hidden ...]
+       (default: 20 seconds, all three cadences)
+
+Compares the old fixed root.after(1000) reschedule with the boundary-aligned
+next_tick_delay_ms scheduler at each cadence the GUI uses: every second while
+focused, UNFOCUSED_TICK_SECONDS while unfocused and HIDDEN_TICK_SECONDS while
+hidden. A cadence runs for at least three of its ticks, so the hidden one
+takes a few minutes. Uses a hidden Tk root when a display is available and a
+sleep-based event loop otherwise.
+"""
+import heapq
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cursor_timer import (HIDDEN_TICK_SECONDS, TICK_SECONDS, UNFOCUSED_TICK_SECONDS,
+                          next_tick_delay_ms)
+
+CADENCES = {"focused": TICK_SECONDS, "unfocused": UNFOCUSED_TICK_SECONDS,
+            "hidden": HIDDEN_TICK_SECONDS}
+
+WORK_SECONDS = 0.003  # stand-in for formatting and redrawing the label
+
+
+class SleepLoop:
+    """Minimal stand-in for the Tk event loop's after() scheduling."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, delay_ms, func):
+        heapq.heappush(self.jobs, (time.monotonic() + delay_ms / 1000, id(func), func))
+
+    def run(self, until):
+        while self.jobs and time.monotonic() < until:
+            deadline, _, func = heapq.heappop(self.jobs)
+            time.sleep(max(0, deadline - time.monotonic()))
+            func()
+
+    def quit(self):
+        self.jobs = []
+
+
+def make_loop():
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+        return root, "tk"
+    except Exception:
+        return SleepLoop(), "sleep"
+
+
+def measure(loop, kind, seconds, aligned, interval=TICK_SECONDS):
+    origin = time.monotonic()
+    ticks = []
+
+    def tick():
+        elapsed = time.monotonic() - origin
+        ticks.append(elapsed)
+        busy_until = time.monotonic() + WORK_SECONDS
+        while time.monotonic() < busy_until:
+            pass
+        if elapsed < seconds:
+            loop.after(next_tick_delay_ms(elapsed, interval) if aligned else interval * 1000, tick)
+        elif kind == "tk":
+            loop.quit()
+
+    loop.after(0, tick)
+    if kind == "tk":
+        loop.mainloop()
+    else:
+        loop.run(origin + seconds + 2)
+    # Phase of each tick relative to the interval boundary it should show
+    phases = [(t - round(t / interval) * interval) * 1000 for t in ticks[1:]]
+    return {
+        "ticks": len(ticks),
+        "final_drift_ms": phases[-1] if phases else 0.0,
+        "mean_phase_ms": statistics.mean(phases) if phases else 0.0,
+        "jitter_ms": statistics.pstdev(phases) if phases else 0.0,
+        "wakeups_per_min": len(ticks) / seconds * 60,
+    }
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    cadences = sys.argv[2:] or list(CADENCES)
+    for cadence in cadences:
+        interval = CADENCES[cadence]
+        for aligned in (False, True):
+            loop, kind = make_loop()
+            result = measure(loop, kind, max(seconds, 3 * interval), aligned, interval)
+            name = "aligned " if aligned else "fixed   "
+            print(f"{cadence:9s} {name} ({kind}) ticks {result['ticks']:4d}  "
+                  f"final drift {result['final_drift_ms']:7.1f} ms  "
+                  f"mean phase {result['mean_phase_ms']:6.1f} ms  "
+                  f"jitter {result['jitter_ms']:6.1f} ms  "
+                  f"wakeups/min {result['wakeups_per_min']:5.1f}")
+            if kind == "tk":
+                loop.destroy()
+
+
+if __name__ == "__main__":
+    main()
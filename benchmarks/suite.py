@@ -0,0 +1,295 @@
+"""Benchmark save latency, stats latency, startup time and peak RSS of both front-ends.
+
+Usage: python benchmarks/suite.py [--rows N ...] [--categories N] [--seed N]
+                                  [--repeat N] [--out FILE] [--baseline FILE]
+                                  [--threshold FRACTION] [--case NAME ...]
+
+For every size in --rows a deterministic history (see synth.py) is written as
+activity_log.csv, activity_log.json and activity_log.jsonl into a scratch
+directory. Each case then runs in a fresh interpreter with that directory as
+its working directory, so its startup and peak RSS are its own. All results
+are lower-is-better numbers written to --out (default: bench_results.json):
+
+    {"meta": {...}, "results": {"100000": {"stats.get_stats.7d.warm_ms": 41.2, ...}}}
+
+With --baseline, every metric that grew by more than --threshold (default
+0.25, i.e. 25%) over the baseline file is reported and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+DEFAULT_THRESHOLD = 0.25
+STATS_DAYS = [7, 30, 365]
+# Lower bound for regressions, so noise on sub-millisecond metrics is ignored
+MIN_DELTA = {"_ms": 1.0, "_kb": 1024}
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB.
+
+    ru_maxrss keeps the high-water mark of the parent across fork and exec,
+    so every case would report the suite's own peak; VmHWM starts afresh with
+    the exec'd interpreter. ru_maxrss is only used where there is no procfs.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def latencies(func, repeat):
+    """Call func repeat times; return the first and the median of the rest in ms."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return times[0], statistics.median(times[1:] or times)
+
+
+class Selection:
+    """Stand-in for the GUI's category StringVar, so no Tk root is needed."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def gui_timer():
+    """A ProductivityTimer with its storage set up as __init__ does, minus the window."""
+    from activity_store import open_journal
+    from chart_cache import ChartCache
+    from cursor_timer import ProductivityTimer
+
+    app = ProductivityTimer.__new__(ProductivityTimer)
+    app.stats_cache = ChartCache()
+    app.overlaps = None
+    app.log_file = "activity_log.jsonl"
+    app.store = open_journal(app.log_file, "activity_log.json")
+    return app
+
+
+# Each case runs in its own process and returns {metric: value}
+
+def case_startup_grok3(repeat):
+    started = time.perf_counter()
+    import grok3_timer  # noqa: F401
+    return {"import_ms": (time.perf_counter() - started) * 1000}
+
+
+def case_startup_cursor(repeat):
+    started = time.perf_counter()
+    import cursor_timer  # noqa: F401
+    imported = time.perf_counter()
+    gui_timer()
+    return {"import_ms": (imported - started) * 1000,
+            "open_store_ms": (time.perf_counter() - imported) * 1000}
+
+
+def case_save_log_session(repeat):
+    import grok3_timer
+    clock = [datetime.datetime.now().replace(microsecond=0)]
+
+    def save():
+        start = clock[0]
+        clock[0] = start + datetime.timedelta(minutes=30)
+        grok3_timer.log_session(start, clock[0], grok3_timer.categories[0])
+
+    cold, warm = latencies(save, repeat)
+    return {"cold_ms": cold, "warm_ms": warm}
+
+
+def case_save_activity(repeat):
+    app = gui_timer()
+    app.category_var = Selection("Coding")
+
+    def save():
+        # save_activity ends the session at the current time
+        app.time_start = datetime.datetime.now() - datetime.timedelta(minutes=30)
+        app.save_activity()
+
+    cold, warm = latencies(save, repeat)
+    return {"cold_ms": cold, "warm_ms": warm}
+
+
+def case_get_stats(repeat):
+    import io
+    import contextlib
+    import grok3_timer
+    result = {}
+    for days in STATS_DAYS:
+        def stats():
+            grok3_timer.stats_cache.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                grok3_timer.get_stats(days)
+        result[f"{days}d.cold_ms"], result[f"{days}d.warm_ms"] = latencies(stats, repeat)
+    return result
+
+
+def case_show_stats(repeat):
+    import threading
+    app = gui_timer()
+    result = {}
+    for days in STATS_DAYS:
+        def stats():
+            app.stats_cache.clear()
+            app.render_stats(days, f"Last {days} Days", cancelled=threading.Event())
+        result[f"{days}d.cold_ms"], result[f"{days}d.warm_ms"] = latencies(stats, repeat)
+    return result
+
+
+CASES = {
+    "startup.grok3_timer": (case_startup_grok3, 1),
+    "startup.cursor_timer": (case_startup_cursor, 1),
+    "save.log_session": (case_save_log_session, 50),
+    "save.save_activity": (case_save_activity, 50),
+    "stats.get_stats": (case_get_stats, 5),
+    "stats.show_stats": (case_show_stats, 5),
+}
+
+
+def run_case(name, directory, repeat=None):
+    """Run one case in a fresh interpreter inside directory; return its metrics."""
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", name]
+    if repeat:
+        command += ["--repeat", str(repeat)]
+    proc = subprocess.run(command, cwd=directory, capture_output=True, text=True,
+                          env=dict(os.environ, MPLBACKEND="Agg"))
+    if proc.returncode != 0:
+        last = proc.stderr.strip().splitlines()[-1:] or ["no output"]
+        print(f"    {name}: failed ({last[0]})")
+        return {}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def prepare(directory, rows, categories, seed):
+    """Write the synthetic logs and category files a case starts from."""
+    from synth import category_names, write_log
+
+    for name in ("activity_log.csv", "activity_log.json", "activity_log.jsonl"):
+        write_log(os.path.join(directory, name), rows, categories, seed)
+    names = category_names(categories)
+    with open(os.path.join(directory, "categories.txt"), "w") as f:
+        f.write("".join(name + "\n" for name in names))
+    with open(os.path.join(directory, "categories.json"), "w") as f:
+        json.dump(names, f)
+
+
+def run_suite(sizes, categories, seed, cases, repeat=None):
+    results = {}
+    for rows in sizes:
+        print(f"{rows} sessions, {categories} categories")
+        metrics = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "source")
+            os.mkdir(source)
+            prepare(source, rows, categories, seed)
+            for i, name in enumerate(cases):
+                # Cases grow the log and leave indexes behind, so each one
+                # starts from a fresh copy of the history
+                directory = shutil.copytree(source, os.path.join(tmp, f"case{i}"))
+                for metric, value in run_case(name, directory, repeat).items():
+                    metrics[f"{name}.{metric}"] = round(value, 3)
+                    print(f"    {name}.{metric:<20} {value:12.2f}")
+                shutil.rmtree(directory)
+        results[str(rows)] = metrics
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return (size, metric, old, new) for every metric that regressed."""
+    regressions = []
+    for size, metrics in results.items():
+        for metric, new in metrics.items():
+            old = baseline.get(size, {}).get(metric)
+            if old is None:
+                continue
+            floor = next((d for suffix, d in MIN_DELTA.items() if metric.endswith(suffix)), 0)
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append((size, metric, old, new))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark both timers on synthetic histories.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="history sizes in sessions (default: 1000 100000 1000000)")
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, help="calls per latency case (default: per case)")
+    parser.add_argument("--case", nargs="+", choices=sorted(CASES), help="only run these cases")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before failing (default: 0.25)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        func, default_repeat = CASES[args.run_case]
+        metrics = func(max(args.repeat or default_repeat, 1))
+        metrics["peak_rss_kb"] = peak_rss_kb()
+        print(json.dumps(metrics))
+        return 0
+
+    cases = args.case or list(CASES)
+    results = run_suite(args.rows, args.categories, args.seed, cases, args.repeat)
+    with open(args.out, "w") as f:
+        json.dump({
+            "meta": {
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "categories": args.categories,
+                "seed": args.seed,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for size, metric, old, new in regressions:
+            print(f"REGRESSION {size} sessions {metric}: {old:.2f} -> {new:.2f} "
+                  f"(+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
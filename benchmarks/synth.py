@@ -0,0 +1,98 @@
+"""Deterministic synthetic activity history for benchmarks.
+
+Usage: python benchmarks/synth.py [--rows N] [--categories N] [--seed N] [--end DATE]
+                                  OUTPUT [OUTPUT ...]
+
+Each OUTPUT is written in the format its extension selects: .csv (the
+grok3_timer log), .json (the legacy cursor_timer array) or .jsonl (the
+journal). The same rows, categories and seed always give the same sessions,
+so results from different runs and machines describe the same history;
+it ends at midnight of --end (default: today) so "last N days" stats find it.
+"""
+import argparse
+import datetime
+import numpy as np
+
+DEFAULT_CATEGORIES = ["Sleeping", "Coding", "Training", "Other"]
+CHUNK_ROWS = 1_000_000
+# Sessions average up to 90 minutes, shorter when needed to fit the rows
+# into MAX_HISTORY, so even 50M rows stay within a plausible date range
+MAX_SLOT_SECONDS = 5400
+MAX_HISTORY_SECONDS = 10 * 365 * 86400
+
+
+def category_names(count):
+    """Return count category names, starting with the front-ends' defaults."""
+    names = DEFAULT_CATEGORIES[:count]
+    return names + [f"Category {i}" for i in range(len(names) + 1, count + 1)]
+
+
+def iter_chunks(rows, categories=4, seed=42, end=None, chunk_rows=CHUNK_ROWS):
+    """Yield (start, end, activity) string arrays of back-to-back sessions.
+
+    Each session takes a slot of on average min(90 minutes, 10 years / rows),
+    90% of it spent in the session and the rest in the gap after it. The
+    history ends around midnight of the date end; timestamps are
+    'YYYY-MM-DDTHH:MM:SS'.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(category_names(categories))
+    slot = max(2, min(MAX_SLOT_SECONDS, MAX_HISTORY_SECONDS // max(rows, 1)))
+    end = np.datetime64(end or datetime.date.today(), "s")
+    t = end - np.timedelta64(int(slot * rows), "s")
+    done = 0
+    while done < rows:
+        n = min(chunk_rows, rows - done)
+        durations = rng.integers(max(1, slot // 5), slot * 8 // 5 + 1, n)
+        gaps = rng.integers(0, slot // 5 + 1, n)
+        codes = rng.integers(0, len(names), n)
+        ends_offset = np.cumsum(durations + gaps) - gaps
+        starts = t + (ends_offset - durations).astype("timedelta64[s]")
+        ends = t + ends_offset.astype("timedelta64[s]")
+        t = ends[-1] + np.timedelta64(int(gaps[-1]), "s")
+        yield starts.astype(str), ends.astype(str), names[codes]
+        done += n
+
+
+def write_log(path, rows, categories=4, seed=42, end=None):
+    """Write rows synthetic sessions to path; returns the end of the last session."""
+    last = None
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            f.write("[")
+        first = True
+        for starts, ends, names in iter_chunks(rows, categories, seed, end):
+            if path.endswith(".csv"):
+                lines = [f"{s[:10]} {s[11:]},{e[:10]} {e[11:]},{a}\n" for s, e, a in zip(starts, ends, names)]
+            else:
+                lines = [f'{{"start_time":"{s}","end_time":"{e}","activity":"{a}"}}'
+                         for s, e, a in zip(starts, ends, names)]
+                if path.endswith(".json"):
+                    lines = [("" if first and i == 0 else ",\n") + line for i, line in enumerate(lines)]
+                else:
+                    lines = [line + "\n" for line in lines]
+            f.write("".join(lines))
+            first = False
+            last = ends[-1]
+        if path.endswith(".json"):
+            f.write("]\n")
+    return datetime.datetime.fromisoformat(str(last)) if last is not None else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic activity history.")
+    parser.add_argument("outputs", nargs="+", help=".csv, .json or .jsonl files to write")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=len(DEFAULT_CATEGORIES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", type=datetime.date.fromisoformat,
+                        help="date the history ends on (default: today)")
+    args = parser.parse_args(argv)
+    for path in args.outputs:
+        last = write_log(path, args.rows, args.categories, args.seed, args.end)
+        print(f"Wrote {args.rows} sessions ending {last} to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
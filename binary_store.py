@@ -0,0 +1,178 @@
+import datetime
+import json
+import os
+import numpy as np
+from analytics import SessionColumns, load_columns
+from category_registry import CategoryRegistry, registry_path_for
+
+MAGIC = b"PTSESS01"
+HEADER_SIZE = len(MAGIC)
+RECORD_DTYPE = np.dtype([("start", "<i8"), ("end", "<i8"), ("category", "<i4")])
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class BinaryStore:
+    """Session log made of fixed-width binary records.
+
+    Each record holds start and end as int64 epoch seconds of the naive local
+    timestamps and an int32 id from the category registry kept next to the
+    store. Reads go through numpy.memmap, so stats run directly over the file
+    without creating Python objects.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._index_version = None
+        self.registry = CategoryRegistry(registry_path_for(path))
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+        else:
+            with open(path, "rb") as f:
+                if f.read(HEADER_SIZE) != MAGIC:
+                    raise ValueError(f"{path} is not a session store")
+
+    def category_id(self, name):
+        """Return the id for a category name, registering it if new."""
+        return self.registry.intern(name)
+
+    def append(self, activity):
+        """Append one activity dict, as used by the stores in activity_store."""
+        self.append_many([(datetime.datetime.fromisoformat(activity['start_time']),
+                           datetime.datetime.fromisoformat(activity['end_time']),
+                           activity['activity'])])
+
+    def append_many(self, sessions):
+        """Append (start, end, activity) tuples with datetime start and end."""
+        records = np.array([
+            (int((start - EPOCH).total_seconds()), int((end - EPOCH).total_seconds()),
+             self.category_id(activity))
+            for start, end, activity in sessions
+        ], dtype=RECORD_DTYPE)
+        self.append_records(records)
+
+    def append_records(self, records):
+        with open(self.path, "ab") as f:
+            # Drop a torn record left behind by an interrupted append
+            size = f.seek(0, os.SEEK_END)
+            torn = (size - HEADER_SIZE) % RECORD_DTYPE.itemsize
+            if torn:
+                f.truncate(size - torn)
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+
+    def records(self):
+        """Return a read-only memmap over all complete records."""
+        count = len(self)
+        if count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode="r",
+                         offset=HEADER_SIZE, shape=(count,))
+
+    def columns(self, since=None):
+        """Expose the store as SessionColumns without copying the data.
+
+        Codes are the stored ids; only if categories were merged are they
+        translated, in one indexing step, to the ids they now count as.
+        """
+        self.registry.refresh()
+        records = self.records()
+        codes = records["category"]
+        if self.registry.merged:
+            codes = np.array(self.registry.remap(), dtype=np.int32)[codes]
+        return SessionColumns(records["start"], records["end"], codes, self.registry.labels())
+
+    def version(self):
+        return os.path.getsize(self.path), self.registry.version()
+
+    def load(self):
+        return [
+            {"start_time": start.isoformat(), "end_time": end.isoformat(), "activity": activity}
+            for start, end, activity in self.iter_sessions()
+        ]
+
+    def interval_index(self):
+        """Interval index over the records, rebuilt only when the store grew."""
+        version = self.version()
+        if self._index_version != version:
+            self._index = self.columns().interval_index()
+            self._index_version = version
+        return self._index
+
+    def window_totals(self, start_date, end_date):
+        """Hours per activity overlapping [start_date, end_date), clipped to it."""
+        return self.interval_index().totals(
+            int((start_date - EPOCH).total_seconds()), int((end_date - EPOCH).total_seconds()))
+
+    def totals(self, days, today=None):
+        if today is None:
+            today = datetime.date.today()
+        first_day = today - datetime.timedelta(days=days - 1)
+        return self.window_totals(
+            datetime.datetime.combine(first_day, datetime.time()),
+            datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time()))
+
+    def iter_sessions(self):
+        """Yield (start, end, activity) datetimes, for exporting."""
+        for start, end, category in self.records():
+            yield (EPOCH + datetime.timedelta(seconds=int(start)),
+                   EPOCH + datetime.timedelta(seconds=int(end)),
+                   self.registry.name(category))
+
+
+def import_log(log_path, store_path):
+    """Append every session of a JSON, JSON-lines or CSV log to a store."""
+    store = BinaryStore(store_path)
+    if log_path.endswith(".json"):
+        with open(log_path, "r") as f:
+            store.append_many(
+                (datetime.datetime.fromisoformat(a['start_time']),
+                 datetime.datetime.fromisoformat(a['end_time']),
+                 a['activity'])
+                for a in json.load(f))
+        return len(store)
+    columns = load_columns(log_path)
+    remap = np.array([store.category_id(name) for name in columns.categories], dtype=np.int32)
+    records = np.empty(len(columns), dtype=RECORD_DTYPE)
+    records["start"] = columns.start
+    records["end"] = columns.end
+    records["category"] = remap[columns.codes]
+    store.append_records(records)
+    return len(store)
+
+
+def export_log(store_path, log_path):
+    """Write a store back out as activity_log.json or activity_log.csv format."""
+    store = BinaryStore(store_path)
+    if log_path.endswith(".csv"):
+        with open(log_path, "w") as f:
+            for start, end, activity in store.iter_sessions():
+                f.write(f"{start.strftime('%Y-%m-%d %H:%M:%S')},{end.strftime('%Y-%m-%d %H:%M:%S')},{activity}\n")
+    else:
+        activities = [
+            {"start_time": start.isoformat(), "end_time": end.isoformat(), "activity": activity}
+            for start, end, activity in store.iter_sessions()
+        ]
+        with open(log_path, "w") as f:
+            json.dump(activities, f)
+    return len(store)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python binary_store.py import <log file> <store>")
+        print("       python binary_store.py export <store> <log file>")
+        sys.exit(1)
+    if sys.argv[1] == "import":
+        count = import_log(sys.argv[2], sys.argv[3])
+        print(f"{sys.argv[3]} now holds {count} sessions")
+    else:
+        count = export_log(sys.argv[2], sys.argv[3])
+        print(f"Exported {count} sessions to {sys.argv[3]}")
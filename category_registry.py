@@ -0,0 +1,193 @@
+import json
+import os
+
+REGISTRY_SUFFIX = ".categories.json"
+REGISTRY_FORMAT = 1
+
+
+def registry_path_for(store_path):
+    """Return the path of the category registry kept next to a log or store."""
+    return store_path + REGISTRY_SUFFIX
+
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class CategoryRegistry:
+    """Stable integer ids for the activity categories of one log.
+
+    Ids are handed out in order and never reused. Every spelling a category
+    has had -- other letter cases, names from before a rename, the names of
+    categories merged into it -- is kept in one lower-cased alias table, so a
+    lookup is a single dict access. Renaming only changes the display name of
+    an id and merging only points one id at another, so records that already
+    hold an id or an old name never need to be rewritten.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.names = []     # id -> display name
+        self.merged = {}    # id -> id it was merged into
+        self.aliases = {}   # lower-cased spelling -> id
+        self._version = None
+        self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self):
+        version = _file_version(self.path)
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if isinstance(data, list):
+            # A plain name list, as BinaryStore kept before the registry
+            data = {"names": data}
+        self.names = list(data["names"])
+        self.merged = {int(k): v for k, v in data.get("merged", {}).items()}
+        self.aliases = dict(data.get("aliases", {}))
+        for i, name in enumerate(self.names):
+            self.aliases.setdefault(name.lower(), i)
+        self._version = version
+
+    def refresh(self):
+        """Reload the registry if another process changed it."""
+        if _file_version(self.path) != self._version:
+            self.load()
+
+    def version(self):
+        return _file_version(self.path)
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "format": REGISTRY_FORMAT,
+                "names": self.names,
+                "merged": self.merged,
+                "aliases": self.aliases
+            }, f)
+        os.replace(tmp_path, self.path)
+        self._version = _file_version(self.path)
+
+    def canonical(self, category_id):
+        """Follow merges from category_id to the id it now counts as."""
+        while category_id in self.merged:
+            category_id = self.merged[category_id]
+        return category_id
+
+    def lookup(self, name):
+        """Return the canonical id for any spelling of a category, or None."""
+        category_id = self.aliases.get(name.strip().lower())
+        return None if category_id is None else self.canonical(category_id)
+
+    def intern(self, name, save=True):
+        """Return the id for name, registering it as a new category if unknown."""
+        category_id = self.lookup(name)
+        if category_id is None:
+            self.refresh()  # another process may have registered it meanwhile
+            category_id = self.lookup(name)
+        if category_id is None:
+            category_id = len(self.names)
+            self.names.append(name.strip())
+            self.aliases[name.strip().lower()] = category_id
+            if save:
+                self.save()
+        return category_id
+
+    def name(self, category_id):
+        """Display name of the category an id counts as."""
+        return self.names[self.canonical(category_id)]
+
+    def display(self, name):
+        """Display name for any spelling of a category; unknown names are kept as-is."""
+        category_id = self.lookup(name)
+        return name if category_id is None else self.names[category_id]
+
+    def active(self):
+        """Display names of the categories that were not merged away, in id order."""
+        return [name for i, name in enumerate(self.names) if i not in self.merged]
+
+    def labels(self):
+        """Display name per id, merged ids showing their target's name."""
+        return [self.name(i) for i in range(len(self.names))]
+
+    def remap(self):
+        """Canonical id per id, for translating stored ids in one indexing step."""
+        return [self.canonical(i) for i in range(len(self.names))]
+
+    def rename(self, name, new_name):
+        """Give a category a new display name; the old name stays an alias."""
+        category_id = self.lookup(name)
+        if category_id is None:
+            raise KeyError(f"unknown category '{name}'")
+        other = self.lookup(new_name)
+        if other is not None and other != category_id:
+            raise ValueError(f"category '{new_name}' already exists, merge instead")
+        self.names[category_id] = new_name.strip()
+        self.aliases[new_name.strip().lower()] = category_id
+        self.save()
+
+    def merge(self, source, target):
+        """Count every session of source as target from now on."""
+        source_id, target_id = self.lookup(source), self.lookup(target)
+        if source_id is None or target_id is None:
+            raise KeyError(f"unknown category '{source if source_id is None else target}'")
+        if source_id != target_id:
+            self.merged[source_id] = target_id
+            self.save()
+
+
+def resolve_totals(totals, registry):
+    """Re-key {activity: hours} by display name, adding up merged categories."""
+    resolved = {}
+    for activity, hours in totals.items():
+        name = registry.display(activity)
+        resolved[name] = resolved.get(name, 0) + hours
+    return resolved
+
+
+def seed_registry(registry, names):
+    """Register names (e.g. a front-end's category list) in one save."""
+    before = len(registry)
+    for name in names:
+        registry.intern(name, save=False)
+    if len(registry) != before:
+        registry.save()
+
+
+if __name__ == "__main__":
+    import sys
+
+    commands = {"list": 3, "rename": 5, "merge": 5}
+    if len(sys.argv) < 2 or commands.get(sys.argv[1]) != len(sys.argv):
+        print("Usage: python category_registry.py list <log file>")
+        print("       python category_registry.py rename <log file> <name> <new name>")
+        print("       python category_registry.py merge <log file> <source> <target>")
+        sys.exit(1)
+    registry = CategoryRegistry(registry_path_for(sys.argv[2]))
+    if os.path.exists(sys.argv[2]):
+        # A CSV or JSON log only holds names; register the ones seen so far
+        from activity_store import open_store
+        seed_registry(registry, open_store(sys.argv[2]).columns().categories)
+    try:
+        if sys.argv[1] == "rename":
+            registry.rename(sys.argv[3], sys.argv[4])
+            print(f"Renamed '{sys.argv[3]}' to '{sys.argv[4]}'")
+        elif sys.argv[1] == "merge":
+            registry.merge(sys.argv[3], sys.argv[4])
+            print(f"Merged '{sys.argv[3]}' into '{registry.display(sys.argv[4])}'")
+        else:
+            for i, name in enumerate(registry.names):
+                merged = f" (merged into {registry.name(i)})" if i in registry.merged else ""
+                print(f"{i}: {name}{merged}")
+    except (KeyError, ValueError) as e:
+        print(e.args[0])
+        sys.exit(1)
@@ -0,0 +1,51 @@
+import collections
+import threading
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class ChartCache:
+    """LRU cache for rendered charts and the totals behind them.
+
+    Keys should combine the query, the store's data version and the current
+    day, so a new session or a new day naturally misses. Entries are evicted
+    least recently used first once the total size passes max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Store value, accounting size bytes against the budget."""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
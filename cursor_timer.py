@@ -1,16 +1,44 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 import json
+import base64
 import datetime
-import pandas as pd
-import matplotlib.pyplot as plt
+import os
+import time
 from pathlib import Path
+from activity_store import open_journal, open_store
+from background import BackgroundTask
+from category_registry import CategoryRegistry, registry_path_for, seed_registry
+from chart_cache import ChartCache
+from daemon import DaemonClient, DaemonError, connect as connect_daemon
+from overlap_index import open_overlap_index
+from plotting import load_pyplot, render_patterns_png, render_pie_png
+from session_checkpoint import (PendingQueue, SessionCheckpoint, checkpoint_path_for,
+                                pending_path_for, validate_session)
+import profiling
+
+# Seconds between timer ticks; the label is refreshed less often when nobody
+# can see it to save CPU wakeups
+TICK_SECONDS = 1
+UNFOCUSED_TICK_SECONDS = 5
+HIDDEN_TICK_SECONDS = 60
+
+# Seconds between checkpoints of the running session, i.e. the most a crash loses
+CHECKPOINT_SECONDS = 5
+
+def next_tick_delay_ms(elapsed, interval):
+    """Milliseconds until elapsed next crosses a multiple of interval seconds.
+
+    Scheduling against the boundary instead of a fixed after(1000) keeps the
+    ticks from drifting by the callback's own run time.
+    """
+    return int((interval - elapsed % interval) * 1000) + 1
 
 class ProductivityTimer:
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Productivity Timer")
-        self.root.geometry("400x600")
+        self.root.geometry("400x650")
         
         # Define color scheme
         self.colors = {
@@ -27,17 +55,41 @@ class ProductivityTimer:
         # Initialize variables
         self.running = False
         self.time_start = None
+        self.tick_origin = None
+        self.tick_job = None
+        self.checkpoint_job = None
+        self.time_label_text = None
+        self.stats_cache = ChartCache()
+        self.overlaps = None
         self.default_categories = ["Sleep", "Work", "Exercise", "Coding", "Other"]
+        
+        # Go through the daemon when one is running, else use the shared
+        # SQLite database when ACTIVITY_DB points at one, otherwise the
+        # journal (migrating the old JSON log if needed)
+        self.store = connect_daemon()
+        self.log_file = os.environ.get("ACTIVITY_DB")
+        if self.store is not None:
+            self.log_file = self.store.path
+        elif self.log_file:
+            self.store = open_store(self.log_file)
+        else:
+            self.log_file = "activity_log.jsonl"
+            self.store = open_journal(self.log_file, "activity_log.json")
         self.load_categories()
         
+        # Only a local session is checkpointed; the daemon keeps the shared one
+        self.checkpoint = None
+        if not isinstance(self.store, DaemonClient):
+            self.checkpoint = SessionCheckpoint(checkpoint_path_for(self.log_file, "cursor_timer"))
+        self.pending = PendingQueue(pending_path_for(self.log_file))
+        
         # Create and configure GUI
         self.setup_gui()
+        self.root.after_idle(self.recover_session)
         
-        # Load or create log file
-        self.log_file = "activity_log.json"
-        if not Path(self.log_file).exists():
-            with open(self.log_file, "w") as f:
-                json.dump([], f)
+        # Catch up right away when the window comes back into view
+        self.root.bind("<Map>", self.wake_timer)
+        self.root.bind("<FocusIn>", self.wake_timer)
     
     def load_categories(self):
         try:
@@ -47,6 +99,12 @@ class ProductivityTimer:
             self.categories = self.default_categories
             with open("categories.json", "w") as f:
                 json.dump(self.categories, f)
+        
+        # The log's registry gives every category a stable id; the list above
+        # only seeds it, the dropdown shows the registry's categories
+        self.registry = CategoryRegistry(registry_path_for(self.log_file))
+        seed_registry(self.registry, self.categories)
+        self.categories = self.registry.active()
     
     def save_categories(self):
         with open("categories.json", "w") as f:
@@ -222,51 +280,206 @@ class ProductivityTimer:
             command=lambda: self.show_stats("month"),
             **button_style
         ).pack(pady=5)
+        
+        tk.Button(
+            self.root,
+            text="View Activity Patterns",
+            command=lambda: self.show_patterns(30),
+            **button_style
+        ).pack(pady=5)
+        
+        # Only shown while some sessions are waiting in the pending queue
+        self.pending_button = tk.Button(
+            self.root,
+            command=self.review_pending,
+            **dict(button_style, bg=self.colors['accent'])
+        )
+        self.update_pending_button()
     
     def toggle_timer(self):
         if not self.running:
-            self.running = True
-            self.time_start = datetime.datetime.now()
-            self.timer_button.config(
-                text="Stop",
-                bg=self.colors['accent']  # Change to red when running
-            )
-            self.update_time()
+            self.start_timer()
         else:
             self.running = False
+            for job in (self.tick_job, self.checkpoint_job):
+                if job is not None:
+                    self.root.after_cancel(job)
+            self.tick_job = self.checkpoint_job = None
             self.timer_button.config(
                 text="Start",
                 bg=self.colors['primary']  # Change back to blue when stopped
             )
             self.save_activity()
+            if self.checkpoint is not None:
+                self.checkpoint.clear()
+    
+    def start_timer(self, start=None):
+        """Start the clock, or resume it for a recovered session that began at start."""
+        time_start = start or datetime.datetime.now()
+        if start is None and isinstance(self.store, DaemonClient):
+            # Pick up a session another front-end already started
+            try:
+                time_start, _ = self.store.start()
+            except (OSError, DaemonError) as e:
+                messagebox.showerror("Error", f"Could not start the session:\n{e}")
+                return
+        self.running = True
+        self.time_start = time_start
+        self.tick_origin = time.monotonic() - (datetime.datetime.now() - self.time_start).total_seconds()
+        self.timer_button.config(
+            text="Stop",
+            bg=self.colors['accent']  # Change to red when running
+        )
+        self.update_time()
+        self.save_checkpoint(sync=True)
+    
+    def save_checkpoint(self, sync=False):
+        """Record the running session and the picked category, then again every CHECKPOINT_SECONDS."""
+        if self.checkpoint is None or not self.running:
+            return
+        self.checkpoint.save(self.time_start, self.registry.lookup(self.category_var.get()), sync)
+        self.checkpoint_job = self.root.after(CHECKPOINT_SECONDS * 1000, self.save_checkpoint)
+    
+    def recover_session(self):
+        """Offer to resume or log a session that was still running when the app last exited."""
+        session = self.checkpoint.load() if self.checkpoint is not None else None
+        if session is None:
+            return
+        if session.category is not None and session.category < len(self.registry):
+            self.category_var.set(self.registry.name(session.category))
+        answer = messagebox.askyesnocancel(
+            "Recover Session",
+            f"A session started {session.start:%Y-%m-%d %H:%M} was still running when the "
+            f"timer last exited (last saved {session.saved:%H:%M:%S}).\n\n"
+            "Yes: resume it\nNo: log it until the last save\nCancel: discard it")
+        if answer:
+            self.start_timer(session.start)
+            return
+        if answer is False:
+            self.save_session(session.start, session.saved, self.category_var.get())
+        self.checkpoint.clear()
+    
+    def tick_interval(self):
+        """Pick the tick cadence from the window's visibility and focus."""
+        if self.root.state() == 'iconic' or not self.root.winfo_viewable():
+            return HIDDEN_TICK_SECONDS
+        try:
+            focused = self.root.focus_displayof() is not None
+        except KeyError:  # focus is on a ttk popdown Tk doesn't know by name
+            focused = True
+        return TICK_SECONDS if focused else UNFOCUSED_TICK_SECONDS
+    
+    def wake_timer(self, event=None):
+        # The root also gets the Map and FocusIn events of every child widget
+        if event is not None and event.widget is not self.root:
+            return
+        if self.running and self.tick_job is not None:
+            self.root.after_cancel(self.tick_job)
+            self.update_time()
     
     def update_time(self):
         if self.running:
-            elapsed_time = datetime.datetime.now() - self.time_start
-            hours, remainder = divmod(int(elapsed_time.total_seconds()), 3600)
+            elapsed = time.monotonic() - self.tick_origin
+            hours, remainder = divmod(int(elapsed), 3600)
             minutes, seconds = divmod(remainder, 60)
-            self.time_label.config(text=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
-            self.root.after(1000, self.update_time)
+            text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+            if text != self.time_label_text:
+                self.time_label.config(text=text)
+                self.time_label_text = text
+            self.tick_job = self.root.after(
+                next_tick_delay_ms(elapsed, self.tick_interval()), self.update_time)
     
     def save_activity(self):
-        if not self.category_var.get():
-            messagebox.showwarning("Warning", "Please select an activity category!")
-            return
-            
-        end_time = datetime.datetime.now()
-        activity = {
-            "start_time": self.time_start.isoformat(),
-            "end_time": end_time.isoformat(),
-            "activity": self.category_var.get()
-        }
-        
-        with open(self.log_file, "r") as f:
-            activities = json.load(f)
-        
-        activities.append(activity)
-        
-        with open(self.log_file, "w") as f:
-            json.dump(activities, f)
+        activity = self.category_var.get()
+        if isinstance(self.store, DaemonClient):
+            # The daemon ends the shared session and, given a category, logs
+            # and indexes it
+            try:
+                start, end = self.store.stop(activity.strip() or None)
+            except (OSError, DaemonError) as e:
+                messagebox.showerror("Error", f"Could not stop the session:\n{e}")
+                return
+            if activity.strip():
+                return
+        else:
+            start, end = self.time_start, datetime.datetime.now()
+        self.save_session(start, end, activity)
+    
+    def save_session(self, start, end, activity):
+        """Log a finished session, or queue it as pending if it is invalid or cannot be written."""
+        reason = validate_session(start, end, activity)
+        if reason is None:
+            try:
+                self.log_session(start, end, activity)
+                return True
+            except (OSError, DaemonError) as e:
+                reason = f"it could not be written ({e})"
+        self.pending.add(start, end, activity, reason)
+        self.update_pending_button()
+        messagebox.showwarning(
+            "Warning",
+            f"The session was kept as pending because {reason}.\n"
+            "Use 'Review Pending Sessions' to log it.")
+        return False
+    
+    def log_session(self, start, end, activity):
+        overlaps = self.overlap_index()
+        overlaps.sync()
+        self.store.append({
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "activity": activity
+        })
+        overlaps.add(start, end)
+    
+    def update_pending_button(self):
+        waiting = len(self.pending)
+        if waiting:
+            self.pending_button.config(text=f"Review Pending Sessions ({waiting})")
+            self.pending_button.pack(pady=5)
+        else:
+            self.pending_button.pack_forget()
+    
+    def review_pending(self):
+        """Log the pending sessions one by one, asking for the category of each."""
+        done = []
+        for entry in self.pending.load():
+            start = datetime.datetime.fromisoformat(entry["start_time"])
+            end = datetime.datetime.fromisoformat(entry["end_time"])
+            if end <= start:
+                if messagebox.askyesno(
+                        "Pending Session",
+                        f"The session from {start:%Y-%m-%d %H:%M} ends before it starts "
+                        "and cannot be logged. Discard it?"):
+                    done.append(entry)
+                continue
+            activity = simpledialog.askstring(
+                "Pending Session",
+                f"{start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} was not logged because "
+                f"{entry['reason']}.\nLog it under (leave empty to discard):",
+                initialvalue=entry["activity"] or self.category_var.get(),
+                parent=self.root)
+            if activity is None:
+                continue  # keep it for later
+            if activity.strip():
+                try:
+                    self.log_session(start, end, activity.strip())
+                except (OSError, DaemonError) as e:
+                    messagebox.showerror("Error", f"Could not log the session:\n{e}")
+                    break
+            done.append(entry)
+        self.pending.remove(done)
+        self.update_pending_button()
+        # Logging under a new name registers it as a category
+        self.registry.refresh()
+        self.categories = self.registry.active()
+        self.category_dropdown['values'] = self.categories
+    
+    def overlap_index(self):
+        """Open the overlap index on first use; it stays in memory afterwards."""
+        if self.overlaps is None:
+            self.overlaps = open_overlap_index(self.store)
+        return self.overlaps
     
     def add_manual_entry(self):
         try:
@@ -291,19 +504,18 @@ class ProductivityTimer:
                 messagebox.showerror("Error", "End time must be after start time!")
                 return
             
-            activity = {
-                "start_time": start_dt.isoformat(),
-                "end_time": end_dt.isoformat(),
-                "activity": self.category_var.get()
-            }
-            
-            with open(self.log_file, "r") as f:
-                activities = json.load(f)
-            
-            activities.append(activity)
+            # Flag sessions that overlap time that is already logged
+            overlaps = self.overlap_index()
+            conflict = overlaps.check(start_dt, end_dt)
+            if conflict and not messagebox.askyesno(
+                    "Overlapping Entry",
+                    f"This entry overlaps time already logged from {conflict[0]:%Y-%m-%d %H:%M} "
+                    f"to {conflict[1]:%Y-%m-%d %H:%M}.\nAdd it anyway?"):
+                return
             
-            with open(self.log_file, "w") as f:
-                json.dump(activities, f)
+            # A write that fails is kept as pending, with a warning
+            if not self.save_session(start_dt, end_dt, self.category_var.get()):
+                return
                 
             messagebox.showinfo("Success", "Manual entry added successfully!")
             
@@ -318,67 +530,128 @@ class ProductivityTimer:
     
     def add_category(self):
         new_category = tk.simpledialog.askstring("New Category", "Enter new category name:")
-        if new_category and new_category not in self.categories:
-            self.categories.append(new_category)
+        if new_category and self.registry.lookup(new_category) is None:
+            self.registry.intern(new_category)
+            self.categories = self.registry.active()
             self.category_dropdown['values'] = self.categories
             self.save_categories()
     
     def show_stats(self, period):
-        with open(self.log_file, "r") as f:
-            activities = json.load(f)
-        
-        if not activities:
-            messagebox.showinfo("Info", "No activities recorded yet!")
-            return
-        
-        df = pd.DataFrame(activities)
-        df['start_time'] = pd.to_datetime(df['start_time'])
-        df['end_time'] = pd.to_datetime(df['end_time'])
-        df['duration'] = (df['end_time'] - df['start_time']).dt.total_seconds() / 3600  # Convert to hours
-        
-        # Filter for the specified period
-        now = pd.Timestamp.now()
         if period == "week":
-            start_date = now - pd.Timedelta(days=7)
+            days = 7
             title = "Last 7 Days Activity Distribution"
         else:  # month
-            start_date = now - pd.Timedelta(days=30)
+            days = 30
             title = "Last 30 Days Activity Distribution"
         
-        df = df[df['start_time'] >= start_date]
+        self.open_chart_window(title, self.render_stats, days, title)
+    
+    def show_patterns(self, days):
+        title = f"Last {days} Days Activity Patterns"
+        self.open_chart_window(title, self.render_patterns, days, title)
+    
+    def open_chart_window(self, title, render, *args):
+        """Open a window that shows the PNG produced by render(*args, cancelled=...)."""
+        # Stats window with a progress indicator while the chart is rendered
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.configure(bg=self.colors['bg'])
+        
+        status = tk.Label(
+            window,
+            text="Computing statistics...",
+            bg=self.colors['bg'],
+            fg=self.colors['text'],
+            font=("Arial", 10)
+        )
+        status.pack(padx=20, pady=10)
+        
+        progress = ttk.Progressbar(window, mode='indeterminate', length=200)
+        progress.pack(padx=20, pady=5)
+        progress.start(10)
+        
+        # Totals and rendering run on a worker thread so update_time keeps ticking
+        task = BackgroundTask(profiling.profile_call, render, *args)
         
-        # Create pie chart
-        plt.figure(figsize=(10, 8))
-        activity_totals = df.groupby('activity')['duration'].sum()
-        plt.pie(activity_totals, labels=activity_totals.index, autopct='%1.1f%%')
-        plt.title(title)
-        plt.show()
+        cancel_button = tk.Button(
+            window,
+            text="Cancel",
+            command=window.destroy,
+            bg=self.colors['accent'],
+            fg=self.colors['secondary'],
+            font=("Arial", 10),
+            relief='flat',
+            padx=10,
+            pady=5
+        )
+        cancel_button.pack(pady=10)
+        window.bind("<Destroy>", lambda event: task.cancel() if event.widget is window else None)
+        
+        self.root.after(100, self.poll_stats, task, window)
+    
+    @profiling.traced("stats.pie")
+    def render_stats(self, days, title, cancelled):
+        """Worker-thread half of show_stats: returns PNG bytes, or None if no data."""
+        key = ("pie", days, self.store.version(), datetime.date.today())
+        cached = self.stats_cache.get(key)
+        if cached is not None:
+            return cached[1]
+        activity_totals = self.store.totals(days)
+        if not activity_totals or cancelled.is_set():
+            return None
+        png = render_pie_png(activity_totals, title)
+        self.stats_cache.put(key, (activity_totals, png), len(png))
+        return png
+    
+    @profiling.traced("stats.patterns")
+    def render_patterns(self, days, title, cancelled):
+        """Worker-thread half of show_patterns: heatmap and time series PNG bytes."""
+        from analytics import histograms, to_epoch  # numpy is only needed here
+        key = ("patterns", days, self.store.version(), datetime.date.today())
+        cached = self.stats_cache.get(key)
+        if cached is not None:
+            return cached
+        today = datetime.date.today()
+        since = datetime.datetime.combine(today - datetime.timedelta(days=days - 1), datetime.time())
+        until = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        hist = histograms(self.store.columns(since), to_epoch(since), to_epoch(until))
+        if not hist.daily.any() or cancelled.is_set():
+            return None
+        png = render_patterns_png(hist, title)
+        self.stats_cache.put(key, png, len(png))
+        return png
+    
+    def poll_stats(self, task, window):
+        if task.cancelled.is_set():
+            return
+        done, png, error = task.poll()
+        if not done:
+            self.root.after(100, self.poll_stats, task, window)
+            return
+        
+        # Replace the progress widgets with the rendered chart
+        for widget in window.winfo_children():
+            widget.destroy()
+        if error is not None:
+            window.destroy()
+            messagebox.showerror("Error", f"Could not compute statistics:\n{error}")
+        elif png is None:
+            window.destroy()
+            messagebox.showinfo("Info", "No activities recorded in this period!")
+        else:
+            window.chart = tk.PhotoImage(data=base64.b64encode(png))
+            tk.Label(window, image=window.chart, bg=self.colors['bg']).pack()
     
     def get_stats(self, days):
         """Calculate and plot statistics for the last specified number of days."""
-        # Define the date range
-        end_date = datetime.datetime.now()
-        start_date = end_date - datetime.timedelta(days=days)
-        total_time = {}
-
-        # Read and process the log file
-        try:
-            with open(self.log_file, "r") as f:
-                activities = json.load(f)
-            
-            for activity in activities:
-                start = datetime.datetime.fromisoformat(activity['start_time'])
-                end = datetime.datetime.fromisoformat(activity['end_time'])
-                activity_name = activity['activity']
-                
-                if start >= start_date and start < end_date:
-                    duration = (end - start).total_seconds() / 3600  # Convert to hours
-                    total_time[activity_name] = total_time.get(activity_name, 0) + duration
-                
-        except FileNotFoundError:
+        if not Path(self.log_file).exists():
             print("No log data found.")
             return
 
+        # Totals come from the store: the per-day rollup index for the
+        # journal, or an SQL aggregate for the database
+        total_time = self.store.totals(days)
+
         # Generate statistics and plots
         if total_time:
             # Print total time per activity
@@ -387,6 +660,7 @@ class ProductivityTimer:
                 print(f"{activity}: {time:.2f} hours")
 
             # Create a figure with two subplots side by side
+            plt = load_pyplot()
             fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
 
             # Prepare data for plotting
@@ -419,5 +693,9 @@ class ProductivityTimer:
         self.root.mainloop()
 
 if __name__ == "__main__":
+    import sys
+
+    if "--profile" in sys.argv[1:]:
+        profiling.enable()
     app = ProductivityTimer()
     app.run() 
\ No newline at end of file
@@ -0,0 +1,373 @@
+"""Local daemon that owns the activity log and serves both front-ends.
+
+Usage: python daemon.py serve [--socket PATH] [--durability MODE] [LOG]
+       python daemon.py status [--socket PATH]
+       python daemon.py shutdown [--socket PATH]
+
+The daemon opens LOG (default: $ACTIVITY_DB, else activity_log.csv) with
+open_store, keeps per-day totals and the overlap index in memory, and funnels
+every write through one BatchWriter, so several front-ends never race on the
+same file and concurrent adds share an fsync (see batch_writer.py).
+Requests and responses are single JSON lines on a Unix socket:
+
+    {"op": "stats", "days": 7}  ->  {"ok": true, "totals": {...}, "version": [...]}
+
+Operations: ping, status, start, stop, add, overlap, stats, version, shutdown.
+The front-ends call connect() and, when a daemon answers, use the returned
+DaemonClient in place of their own store.
+"""
+import datetime
+import json
+import os
+import socket
+import threading
+from batch_writer import DURABILITY_MODES, BatchWriter
+from category_registry import resolve_totals
+from profiling import span
+
+SOCKET_FILE = os.environ.get("ACTIVITY_SOCKET", "activity.sock")
+EPOCH_DAY = datetime.date(1970, 1, 1)
+
+
+class DaemonError(Exception):
+    """The daemon rejected a request."""
+
+
+class DaemonClient:
+    """Blocking client that offers the activity store interface over the socket.
+
+    append, totals and version go to the daemon; columns and load read the
+    daemon's log directly, which is safe because writers only ever append.
+    One connection is kept open and shared by all threads.
+    """
+
+    def __init__(self, path=SOCKET_FILE, timeout=5):
+        self.socket_path = path
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(path)
+        self._file = self._sock.makefile("rb")
+        self.path = self.request("ping")["log"]
+        self._local = None
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def request(self, op, **args):
+        args["op"] = op
+        data = (json.dumps(args, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            self._sock.sendall(data)
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError("daemon closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", "request failed"))
+        return response
+
+    # Store interface
+
+    def append(self, activity):
+        self.request("add", **activity)
+
+    def totals(self, days, today=None):
+        args = {"days": days}
+        if today is not None:
+            args["today"] = today.isoformat()
+        return self.request("stats", **args)["totals"]
+
+    def version(self):
+        return _hashable(self.request("version")["version"])
+
+    def columns(self, since=None):
+        return self.local_store().columns(since)
+
+    def load(self):
+        return self.local_store().load()
+
+    def local_store(self):
+        if self._local is None:
+            from activity_store import open_store
+            self._local = open_store(self.path)
+        return self._local
+
+    def overlap_index(self):
+        return RemoteOverlaps(self)
+
+    # Running session, shared by every connected front-end
+
+    def start(self):
+        """Start the shared session; returns (start, was_already_running)."""
+        response = self.request("start")
+        return datetime.datetime.fromisoformat(response["start_time"]), response["already_running"]
+
+    def stop(self, activity=None):
+        """Stop the shared session and log it under activity if given.
+
+        Returns (start, end) of the stopped session.
+        """
+        response = self.request("stop", activity=activity)
+        return (datetime.datetime.fromisoformat(response["start_time"]),
+                datetime.datetime.fromisoformat(response["end_time"]))
+
+    def running_since(self):
+        """Start of the shared session, or None if none is running."""
+        start = self.request("status")["start_time"]
+        return datetime.datetime.fromisoformat(start) if start else None
+
+
+class RemoteOverlaps:
+    """The daemon's overlap index, with the OverlapIndex find/check/add/sync methods."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def find(self, start, end):
+        overlap = self.client.request("overlap", start_time=start.isoformat(),
+                                      end_time=end.isoformat())["overlap"]
+        if overlap is None:
+            return None
+        return tuple(datetime.datetime.fromisoformat(t) for t in overlap)
+
+    def check(self, start, end):
+        return self.find(start, end)
+
+    def add(self, start, end):
+        pass  # the daemon indexes every session it appends
+
+    def sync(self):
+        pass
+
+
+def _hashable(value):
+    # JSON turns version tuples into lists; cache keys need them hashable
+    return tuple(_hashable(v) for v in value) if isinstance(value, list) else value
+
+
+def connect(path=SOCKET_FILE):
+    """Return a DaemonClient if a daemon is listening on path, else None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return DaemonClient(path)
+    except OSError:
+        return None
+
+
+class ActivityDaemon:
+    """Holds the store, its per-day totals and the running session."""
+
+    def __init__(self, log_path, durability=None):
+        from activity_store import open_store
+        from overlap_index import OverlapIndex
+        self.log_path = log_path
+        self.store = open_store(log_path)
+        self.writer = BatchWriter(self.store, durability=durability)
+        self.overlaps = OverlapIndex(self.store)
+        self.running_since = None
+        self.days = {}  # epoch day number -> {activity: seconds}
+        self.base_version = self.store.version()
+        self.added = 0
+        self.lock = threading.Lock()  # guards running_since, days, overlaps and added
+        self.load_days()
+
+    def load_days(self):
+        from analytics import daily_buckets
+        with span("daemon.load", path=self.log_path) as s:
+            try:
+                columns = self.store.columns()
+            except FileNotFoundError:
+                return  # nothing has been logged yet
+            for (day, activity), seconds in daily_buckets(columns).items():
+                self.days.setdefault(day, {})[activity] = seconds
+            s.set(records=len(columns))
+
+    def add_session(self, start, end, activity):
+        """Append a session to the store and fold it into the hot totals."""
+        from stats_index import split_by_day
+        self.writer.append({
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "activity": activity
+        })
+        with self.lock:
+            self.overlaps.add(start, end)
+            for day, seconds in split_by_day(start, end):
+                bucket = self.days.setdefault((day - EPOCH_DAY).days, {})
+                bucket[activity] = bucket.get(activity, 0) + seconds
+            self.added += 1
+
+    def totals(self, days, today=None):
+        """Hours per activity over the last `days` calendar days, from memory."""
+        if today is None:
+            today = datetime.date.today()
+        last = (today - EPOCH_DAY).days
+        total_time = {}
+        with self.lock:
+            for day in range(last - days + 1, last + 1):
+                for activity, seconds in self.days.get(day, {}).items():
+                    total_time[activity] = total_time.get(activity, 0) + seconds / 3600
+        # Apply renames and merges made since the totals were loaded
+        self.store.registry.refresh()
+        return resolve_totals(total_time, self.store.registry)
+
+    def version(self):
+        # Counting our own appends is cheaper than a stat, and does not lag
+        # behind records that are still queued in the writer
+        return [self.base_version, self.added, self.store.registry.version()]
+
+    # Request handlers; each returns the response fields
+
+    def op_ping(self, request):
+        return {"log": os.path.abspath(self.log_path), "pid": os.getpid()}
+
+    def op_status(self, request):
+        return {"start_time": self.running_since.isoformat() if self.running_since else None,
+                "version": self.version()}
+
+    def op_version(self, request):
+        return {"version": self.version()}
+
+    def op_start(self, request):
+        with self.lock:
+            already_running = self.running_since is not None
+            if not already_running:
+                self.running_since = datetime.datetime.now()
+            return {"start_time": self.running_since.isoformat(), "already_running": already_running}
+
+    def op_stop(self, request):
+        with self.lock:
+            if self.running_since is None:
+                raise DaemonError("no session is running")
+            start, end = self.running_since, datetime.datetime.now()
+            self.running_since = None
+        if request.get("activity"):
+            self.add_session(start, end, request["activity"])
+        return {"start_time": start.isoformat(), "end_time": end.isoformat()}
+
+    def op_add(self, request):
+        start, end = _session_bounds(request)
+        if not request.get("activity"):
+            raise DaemonError("activity is required")
+        self.add_session(start, end, request["activity"])
+        return {"version": self.version()}
+
+    def op_overlap(self, request):
+        start, end = _session_bounds(request)
+        with self.lock:
+            overlap = self.overlaps.find(start, end)
+        return {"overlap": [t.isoformat() for t in overlap] if overlap else None}
+
+    def op_stats(self, request):
+        today = datetime.date.fromisoformat(request["today"]) if request.get("today") else None
+        return {"totals": self.totals(int(request["days"]), today), "version": self.version()}
+
+    # Operations that may wait for an fsync; they run on worker threads, so
+    # adds from several clients can share one batch
+    BLOCKING = ("add", "stop")
+
+    async def handle(self, reader, writer):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise DaemonError("a request must be a JSON object")
+                    op = request.get("op")
+                    if op == "shutdown":
+                        writer.write(b'{"ok":true}\n')
+                        await writer.drain()
+                        self.server.close()
+                        break
+                    handler = getattr(self, f"op_{op}", None)
+                    if handler is None:
+                        raise DaemonError(f"unknown operation {op!r}")
+                    with span(f"daemon.{op}"):
+                        if op in self.BLOCKING:
+                            response = await loop.run_in_executor(None, handler, request)
+                        else:
+                            response = handler(request)
+                    response["ok"] = True
+                except (DaemonError, ValueError, KeyError, TypeError) as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write((json.dumps(response, separators=(",", ":")) + "\n").encode("utf-8"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=SOCKET_FILE):
+        import asyncio
+        if os.path.exists(socket_path):
+            if connect(socket_path) is not None:
+                raise RuntimeError(f"a daemon is already listening on {socket_path}")
+            os.remove(socket_path)  # stale socket of a daemon that died
+        self.server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        try:
+            async with self.server:
+                await self.server.wait_closed()
+        finally:
+            self.writer.close()
+            try:
+                os.remove(socket_path)
+            except FileNotFoundError:
+                pass
+
+
+def _session_bounds(request):
+    start = datetime.datetime.fromisoformat(request["start_time"])
+    end = datetime.datetime.fromisoformat(request["end_time"])
+    if end <= start:
+        raise DaemonError("end_time must be after start_time")
+    return start, end
+
+
+def main(argv=None):
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Serve the activity log to both front-ends.")
+    parser.add_argument("command", choices=["serve", "status", "shutdown"])
+    parser.add_argument("log", nargs="?",
+                        default=os.environ.get("ACTIVITY_DB") or "activity_log.csv",
+                        help="log or store to own (default: $ACTIVITY_DB or activity_log.csv)")
+    parser.add_argument("--socket", default=SOCKET_FILE,
+                        help=f"Unix socket path (default: $ACTIVITY_SOCKET or {SOCKET_FILE})")
+    parser.add_argument("--durability", choices=DURABILITY_MODES,
+                        help="when adds are fsync'd (default: $ACTIVITY_DURABILITY or sync)")
+    # Options may come between the command and the log
+    args = parser.parse_intermixed_args(argv)
+
+    if args.command == "serve":
+        daemon = ActivityDaemon(args.log, args.durability)
+        print(f"Serving {args.log} on {args.socket}")
+        try:
+            asyncio.run(daemon.serve(args.socket))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    client = connect(args.socket)
+    if client is None:
+        print(f"No daemon is listening on {args.socket}")
+        return 1
+    if args.command == "status":
+        status = client.request("status")
+        print(f"Serving {client.path}")
+        print(f"Session running since {status['start_time']}" if status["start_time"]
+              else "No session running")
+    else:
+        client.request("shutdown")
+        print("Daemon stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
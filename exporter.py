@@ -0,0 +1,312 @@
+"""Streaming export of an activity log to month-partitioned Parquet, Arrow or CSV.
+
+Usage: python exporter.py [--format parquet|arrow|csv] [--out DIR]
+                          [--batch-size N] [--full] [LOG]
+
+Two datasets are written under DIR, partitioned by month in the Hive layout
+that BI tools read directly:
+
+    sessions/month=2024-03/part-0000000000.parquet   start_time, end_time, activity, seconds
+    daily/month=2024-03/daily.parquet                day, activity, seconds, hours
+
+Sessions belong to the month they start in; daily rows split sessions at
+midnight, like the stats do. LOG (default activity_log.csv) is streamed in
+batches of --batch-size sessions, archived segments included, so memory use
+does not grow with the log. Activities are exported under their current
+category names (see category_registry.py).
+
+export_state.json in DIR records how far the log was exported. For CSV logs
+and journals a later run only reads the lines appended since: they become new
+part files in their months, and only the daily files of the months they touch
+are rewritten. Everything is exported again when the log was rewritten (e.g.
+by archiving), categories were renamed or merged, the format changed, or
+--full is given; other stores are exported again whenever they changed.
+Parquet and Arrow need pyarrow, CSV only the standard library.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import shutil
+import time
+from activity_store import open_store
+from category_registry import CategoryRegistry, registry_path_for
+from log_reader import parse_timestamp
+from profiling import span, traced
+from segments import SegmentSet, iter_segment
+from stats_index import parse_log_line, split_by_day
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+STATE_FILE = "export_state.json"
+STATE_FORMAT = 1
+DEFAULT_BATCH_SIZE = 100000
+SESSION_COLUMNS = ("start_time", "end_time", "activity", "seconds")
+DAILY_COLUMNS = ("day", "activity", "seconds", "hours")
+
+
+def month_of(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def partition_dir(out_dir, dataset, month):
+    return os.path.join(out_dir, dataset, f"month={month}")
+
+
+def _schema(dataset):
+    import pyarrow as pa
+    if dataset == "sessions":
+        return pa.schema([("start_time", pa.timestamp("us")), ("end_time", pa.timestamp("us")),
+                          ("activity", pa.string()), ("seconds", pa.int64())])
+    return pa.schema([("day", pa.date32()), ("activity", pa.string()),
+                      ("seconds", pa.float64()), ("hours", pa.float64())])
+
+
+def write_table(path, dataset, rows, fmt):
+    """Write rows (tuples in the dataset's column order) to path in one go.
+
+    The file is written under a temporary name and moved into place, so
+    readers never see a partial file.
+    """
+    columns = SESSION_COLUMNS if dataset == "sessions" else DAILY_COLUMNS
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if fmt == "csv":
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(
+                tuple(str(v) if isinstance(v, datetime.date) else v for v in row)
+                for row in rows)
+    else:
+        import pyarrow as pa
+        schema = _schema(dataset)
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+            schema=schema)
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def iter_tail(path, offset, registry):
+    """Yield (start, end, activity, offset after the line) from a CSV log or journal.
+
+    Reading starts at byte offset; an incomplete last line is left for the
+    next run, as the rollup index does.
+    """
+    is_csv = path.endswith(".csv")
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            session = parse_log_line(line, is_csv, registry)
+            if session is not None:
+                yield session + (offset,)
+
+
+def iter_store(path):
+    """Yield (start, end, activity, None) for every session of a store that has no byte offsets."""
+    store = open_store(path)
+    if path.endswith(".bin"):
+        for session in store.iter_sessions():
+            yield session + (None,)
+        return
+    for record in store:
+        yield (datetime.datetime.fromisoformat(record["start_time"]),
+               datetime.datetime.fromisoformat(record["end_time"]),
+               record["activity"], None)
+
+
+def iter_archived(segments):
+    for segment_path, _ in segments.segments:
+        for start, end, activity in iter_segment(segment_path):
+            start, end = parse_timestamp(start), parse_timestamp(end)
+            if start is not None and end is not None:
+                yield start, end, activity, None
+
+
+def tail_consistent(path, offset):
+    """Check that offset still ends a line of the log, i.e. it was only appended to."""
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return offset == 0
+    if offset > size:
+        return False
+    if offset == 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
+
+
+def _normalized(value):
+    # Tuples and int keys as they come back from the JSON state file
+    return json.loads(json.dumps(value))
+
+
+class Exporter:
+    """Exports one log into out_dir, picking up where the last run stopped."""
+
+    def __init__(self, log_path, out_dir, fmt="parquet", batch_size=DEFAULT_BATCH_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        self.log_path = log_path
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.state_path = os.path.join(out_dir, STATE_FILE)
+        self.registry = CategoryRegistry(registry_path_for(log_path))
+        self.segments = SegmentSet(log_path)
+        self.has_offsets = log_path.endswith((".csv", ".jsonl"))
+        self.state = self.load_state()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get("format") != STATE_FORMAT:
+            return None
+        return state
+
+    def save_state(self):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def source_state(self):
+        """What a run depends on besides the appended sessions themselves."""
+        return _normalized({
+            "log": os.path.abspath(self.log_path),
+            "output": self.fmt,
+            "segments": [[os.path.basename(p), h["count"], h["last_end"]]
+                         for p, h in self.segments.segments],
+            "version": None if self.has_offsets else open_store(self.log_path).version()
+        })
+
+    def can_resume(self, source):
+        """True if the last export can be extended by the sessions appended since."""
+        state = self.state
+        if state is None or state["source"] != source:
+            return False
+        # A rename or merge since then relabels sessions already exported
+        if any(self.registry.display(name) != label for name, label in state["labels"].items()):
+            return False
+        return not self.has_offsets or tail_consistent(self.log_path, state["offset"])
+
+    @traced("export.run", lambda summary: {"records": summary["records"]})
+    def run(self, full=False):
+        """Export what changed since the last run, or everything; returns a summary."""
+        self.registry.refresh()
+        source = self.source_state()
+        incremental = not full and self.can_resume(source)
+        if not incremental:
+            for dataset in ("sessions", "daily"):
+                shutil.rmtree(os.path.join(self.out_dir, dataset), ignore_errors=True)
+            self.state = {"format": STATE_FORMAT, "offset": 0, "records": 0, "labels": {}, "daily": {}}
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        if self.has_offsets:
+            sessions = iter_tail(self.log_path, self.state["offset"], self.registry)
+        elif incremental:
+            sessions = iter(())  # the store did not change
+        else:
+            sessions = iter_store(self.log_path)
+        if not incremental:
+            sessions = itertools.chain(iter_archived(self.segments), sessions)
+
+        first = records = self.state["records"]
+        session_months = set()
+        daily_months = set()
+        display = self.state["labels"]  # name in the log -> exported category name
+        while True:
+            batch = list(itertools.islice(sessions, self.batch_size))
+            if not batch:
+                break
+            with span("export.batch", records=len(batch)):
+                parts = {}
+                for start, end, activity, offset in batch:
+                    name = display.get(activity)
+                    if name is None:
+                        name = display[activity] = self.registry.display(activity)
+                    parts.setdefault(month_of(start), []).append(
+                        (start, end, name, int((end - start).total_seconds())))
+                    for day, seconds in split_by_day(start, end):
+                        month = month_of(day)
+                        buckets = self.state["daily"].setdefault(month, {}).setdefault(day.isoformat(), {})
+                        buckets[name] = buckets.get(name, 0) + seconds
+                        daily_months.add(month)
+                # Part names come from the index of the batch's first session,
+                # so a run repeated after a crash overwrites its own parts
+                for month, rows in parts.items():
+                    directory = partition_dir(self.out_dir, "sessions", month)
+                    os.makedirs(directory, exist_ok=True)
+                    write_table(os.path.join(directory, f"part-{records:010d}{FORMATS[self.fmt]}"),
+                                "sessions", rows, self.fmt)
+                session_months.update(parts)
+                records += len(batch)
+                if batch[-1][3] is not None:
+                    self.state["offset"] = batch[-1][3]
+
+        for month in sorted(daily_months):
+            rows = [(datetime.date.fromisoformat(day), activity, seconds, seconds / 3600)
+                    for day, buckets in sorted(self.state["daily"][month].items())
+                    for activity, seconds in sorted(buckets.items())]
+            directory = partition_dir(self.out_dir, "daily", month)
+            os.makedirs(directory, exist_ok=True)
+            write_table(os.path.join(directory, f"daily{FORMATS[self.fmt]}"), "daily", rows, self.fmt)
+
+        # The state goes last: until it is saved, a new run redoes this one
+        self.state.update(source=source, records=records)
+        self.save_state()
+        return {"full": not incremental, "records": records - first,
+                "exported": len(session_months), "daily": len(daily_months)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export an activity log as month-partitioned files.")
+    parser.add_argument("log", nargs="?", default="activity_log.csv",
+                        help="log or store to export (default: activity_log.csv)")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet",
+                        help="output format (default: parquet)")
+    parser.add_argument("--out", default="export", help="output directory (default: export)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"sessions held in memory at a time (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--full", action="store_true",
+                        help="export everything again instead of only what changed")
+    args = parser.parse_args(argv)
+
+    if args.format != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print(f"--format {args.format} needs pyarrow (pip install pyarrow); "
+                  "use --format csv without it")
+            return 1
+
+    started = time.perf_counter()
+    summary = Exporter(args.log, args.out, args.format, args.batch_size).run(args.full)
+    elapsed = time.perf_counter() - started
+    kind = "Exported" if summary["full"] else "Incrementally exported"
+    print(f"{kind} {summary['records']} sessions into {summary['exported']} monthly partitions "
+          f"and rewrote {summary['daily']} daily partitions in {elapsed:.2f}s")
+    print(f"Export written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
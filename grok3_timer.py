@@ -1,12 +1,45 @@
 import datetime
-import matplotlib.pyplot as plt
 import os
+import sys
+import threading
+from activity_store import CsvLog, open_store
+from batch_writer import BatchWriter
+from category_registry import CategoryRegistry, registry_path_for, seed_registry
+from chart_cache import ChartCache
+from daemon import DaemonClient, DaemonError, connect as connect_daemon
+from overlap_index import open_overlap_index
+from plotting import render_bar_pie_png, render_patterns_png
+from session_checkpoint import (PendingQueue, SessionCheckpoint, checkpoint_path_for,
+                                pending_path_for, validate_session)
+import profiling
 
 # Constants
 CATEGORIES_FILE = "categories.txt"
 ACTIVITY_LOG_FILE = "activity_log.csv"
+ACTIVITY_DB_FILE = os.environ.get("ACTIVITY_DB")  # optional shared SQLite store
 STATS_OUTPUT_FILE = "stats.png"
+PATTERNS_OUTPUT_FILE = "patterns.png"
 DEFAULT_CATEGORIES = ["Sleeping", "Coding", "Training", "Other"]
+CHECKPOINT_INTERVAL = 5  # seconds between checkpoints of the running session
+IDLE_DELAY = 2           # seconds without input before stats are precomputed
+PRECOMPUTE_DAYS = [7, 30]
+MAX_PRECOMPUTED = 4      # most recently asked day counts that are kept precomputed
+
+# Rendered charts and totals, reused until the log changes or the day rolls over
+stats_cache = ChartCache()
+
+# Connection to the activity daemon, when one is running (see daemon.py)
+daemon_client = None
+
+# Queues logged sessions and commits them in batches; ACTIVITY_DURABILITY
+# selects when they are fsync'd (see batch_writer.py)
+session_writer = None
+
+# Category ids of the log, opened by category_registry()
+registry = None
+
+# Crash-safe record of the running session, opened by session_checkpoint()
+checkpoint = None
 
 # Function to save categories to a file
 def save_categories():
@@ -19,27 +52,47 @@ try:
     with open(CATEGORIES_FILE, "r") as f:
         categories = [line.strip() for line in f if line.strip()]
 except FileNotFoundError:
-    categories = DEFAULT_CATEGORIES
+    categories = list(DEFAULT_CATEGORIES)
 
-def get_activity():
+def category_registry():
+    """Open the log's category registry, seeding it from the category list on first use.
+
+    The menu then lists the registry's categories, so renames, merges and
+    categories added by the other front-end show up too.
+    """
+    global registry
+    if registry is None:
+        registry = CategoryRegistry(registry_path_for(open_log().path))
+        seed_registry(registry, categories)
+    registry.refresh()
+    categories[:] = registry.active()
+    return registry
+
+def add_category(name):
+    """Register a new category and save the category list."""
+    category_registry().intern(name)
+    categories[:] = registry.active()
+    save_categories()
+
+async def get_activity(console, run):
     """Prompt the user to select or create an activity category."""
+    registry = await run(category_registry)
     while True:
         print("Select activity:")
         for i, cat in enumerate(categories, 1):
             print(f"{i}. {cat}")
         print(f"{len(categories)+1}. Create new category")
-        choice = input("Enter number: ")
+        choice = await console.input("Enter number: ")
         try:
             index = int(choice) - 1
             if 0 <= index < len(categories):
                 return categories[index]
             elif index == len(categories):
-                new_cat = input("Enter new category name: ").strip()
-                if new_cat.lower() in [c.lower() for c in categories]:
+                new_cat = (await console.input("Enter new category name: ")).strip()
+                if new_cat and registry.lookup(new_cat) is not None:
                     print("Category already exists.")
                 elif new_cat:
-                    categories.append(new_cat)
-                    save_categories()
+                    await run(add_category, new_cat)
                     print(f"Category '{new_cat}' added.")
                 else:
                     print("Category name cannot be empty.")
@@ -50,37 +103,95 @@ def get_activity():
         except ValueError:
             print("Please enter a number.")
 
+def open_log():
+    """Use the daemon if one is running, else the SQLite store if ACTIVITY_DB is set,
+    otherwise the CSV log."""
+    global daemon_client
+    if daemon_client is None:
+        daemon_client = connect_daemon()
+    if daemon_client is not None:
+        return daemon_client
+    return open_store(ACTIVITY_DB_FILE or ACTIVITY_LOG_FILE)
+
+def start_session():
+    """Return (start time, already running); the daemon shares one session between front-ends."""
+    store = open_log()
+    if isinstance(store, DaemonClient):
+        return store.start()
+    return datetime.datetime.now(), False
+
+def stop_session(start_time):
+    """Return (start, end) of the session that is being stopped."""
+    store = open_log()
+    if isinstance(store, DaemonClient):
+        return store.stop()
+    return start_time, datetime.datetime.now()
+
 def log_session(start, end, activity):
-    """Log the session details to a CSV file."""
-    with open(ACTIVITY_LOG_FILE, "a") as f:
-        f.write(f"{start.strftime('%Y-%m-%d %H:%M:%S')},{end.strftime('%Y-%m-%d %H:%M:%S')},{activity}\n")
+    """Log the session details to the activity store."""
+    global session_writer
+    store = open_log()
+    overlaps = open_overlap_index(store)
+    overlaps.sync()
+    activity = {
+        "start_time": start.isoformat(),
+        "end_time": end.isoformat(),
+        "activity": activity
+    }
+    if isinstance(store, DaemonClient):
+        store.append(activity)
+    else:
+        if session_writer is None:
+            session_writer = BatchWriter(store, on_error=keep_pending)
+        session_writer.append(activity)
+    overlaps.add(start, end)
+
+def find_overlap(start, end):
+    """Return the (start, end) of logged time overlapping the session, or None."""
+    return open_overlap_index(open_log()).check(start, end)
+
+def compute_stats(days):
+    """Return (hours per activity, bar/pie PNG) for the last days, or None if there is no log."""
+    if session_writer is not None:
+        session_writer.flush()  # count sessions still queued for a batch
+    store = open_log()
+    if isinstance(store, CsvLog) and not os.path.exists(store.path):
+        return None
+
+    # Reuse the last result for this query while the log and day are unchanged
+    key = ("stats", days, store.version(), datetime.date.today())
+    cached = stats_cache.get(key)
+    if cached is None:
+        # Totals come from the per-day rollup index for the CSV log, an SQL
+        # aggregate when the SQLite store is used, or the daemon's memory
+        total_time = store.totals(days)
+        png = render_bar_pie_png(total_time, f"Time spent in the last {days} days") if total_time else None
+        cached = (total_time, png)
+        stats_cache.put(key, cached, len(png) if png else 0)
+    return cached
+
+@profiling.traced("stats.precompute")
+def precompute_stats(days_list, precomputed=None):
+    """Fill the stats cache for each number of days, so stats answers from memory.
+
+    Returns the log version, day and day counts the cache now holds; nothing
+    is computed if they match precomputed, what the last call returned.
+    """
+    key = (open_log().version(), datetime.date.today(), tuple(days_list))
+    if key != precomputed:
+        for days in days_list:
+            if compute_stats(days) is None:
+                break
+    return key
 
+@profiling.traced("stats.bar_pie")
 def get_stats(days):
     """Calculate and plot statistics for the last specified number of days."""
-    # Define the date range
-    end_date = datetime.datetime.now()
-    start_date = end_date - datetime.timedelta(days=days)
-    total_time = {}
-
-    # Read and process the log file
-    try:
-        with open(ACTIVITY_LOG_FILE, "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) != 3:
-                    continue
-                start_str, end_str, activity = parts
-                try:
-                    start = datetime.datetime.strptime(start_str, "%Y-%m-%d %H:%M:%S")
-                    end = datetime.datetime.strptime(end_str, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    continue
-                if start >= start_date and start < end_date:
-                    duration = (end - start).total_seconds() / 3600  # Convert to hours
-                    total_time[activity] = total_time.get(activity, 0) + duration
-    except FileNotFoundError:
+    stats = compute_stats(days)
+    if stats is None:
         print("No log data found.")
         return
+    total_time, png = stats
 
     # Generate statistics and plots
     if total_time:
@@ -89,125 +200,321 @@ def get_stats(days):
         for activity, time in sorted(total_time.items()):
             print(f"{activity}: {time:.2f} hours")
 
-        # Prepare data for plotting
-        sorted_activities = sorted(total_time.keys())
-        times = [total_time[act] for act in sorted_activities]
-
-        # Create a figure with two subplots side by side
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
-
-        # Bar chart on the left subplot
-        ax1.bar(sorted_activities, times)
-        ax1.set_xlabel("Activity")
-        ax1.set_ylabel("Hours")
-        ax1.set_title("Bar Chart")
-
-        # Pie chart on the right subplot
-        ax2.pie(times, labels=sorted_activities, autopct='%1.1f%%')
-        ax2.set_title("Pie Chart")
-
-        # Overall title for the figure
-        plt.suptitle(f"Time spent in the last {days} days")
-        
         # Save the figure
-        plt.savefig(STATS_OUTPUT_FILE)
+        with open(STATS_OUTPUT_FILE, "wb") as f:
+            f.write(png)
         print(f"Statistics plots saved to {STATS_OUTPUT_FILE}")
     else:
         print("No data in the specified range.")
+@profiling.traced("stats.patterns")
+def get_patterns(days):
+    """Plot hour-of-day x weekday heatmap and daily/weekly series for the last days."""
+    from analytics import histograms, to_epoch  # numpy is only needed here
 
+    store = open_log()
+    key = ("patterns", days, store.version(), datetime.date.today())
+    png = stats_cache.get(key)
+    if png is None:
+        today = datetime.date.today()
+        since = datetime.datetime.combine(today - datetime.timedelta(days=days - 1), datetime.time())
+        until = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        hist = histograms(store.columns(since), to_epoch(since), to_epoch(until))
+        png = render_patterns_png(hist, f"Activity patterns in the last {days} days") if hist.daily.any() else b""
+        stats_cache.put(key, png, len(png))
 
-def main():
-    """Main application loop."""
-    is_running = False
-    print("Welcome to the Activity Stopwatch App.")
+    if png:
+        with open(PATTERNS_OUTPUT_FILE, "wb") as f:
+            f.write(png)
+        print(f"Activity patterns saved to {PATTERNS_OUTPUT_FILE}")
+    else:
+        print("No data in the specified range.")
+
+
+def session_checkpoint():
+    """Open this front-end's checkpoint of the running session on the log."""
+    global checkpoint
+    if checkpoint is None:
+        checkpoint = SessionCheckpoint(checkpoint_path_for(open_log().path, "grok3_timer"))
+    return checkpoint
+
+def pending_sessions():
+    return PendingQueue(pending_path_for(open_log().path))
+
+def keep_pending(batch, error):
+    """Queue the sessions of a batch that failed after BatchWriter.append returned."""
+    queue = pending_sessions()
+    for activity in batch:
+        queue.add(datetime.datetime.fromisoformat(activity["start_time"]),
+                  datetime.datetime.fromisoformat(activity["end_time"]),
+                  activity["activity"], f"it could not be written ({error})")
+    print(f"\n{len(batch)} session(s) could not be written ({error}) and were kept as pending. "
+          "Use 'pending' to review them.")
+
+def save_session(start, end, activity):
+    """Log a session, or queue it as pending if it is invalid or cannot be written.
+
+    Returns True if the session was logged.
+    """
+    reason = validate_session(start, end, activity)
+    if reason is None:
+        try:
+            log_session(start, end, activity)
+            return True
+        except (OSError, DaemonError) as e:
+            reason = f"it could not be written ({e})"
+    pending_sessions().add(start, end, activity, reason)
+    print(f"Session kept as pending because {reason}. Use 'pending' to review it.")
+    return False
+
+
+class Console:
+    """Reads stdin on a daemon thread, so waiting for a command never blocks the event loop."""
+
+    def __init__(self):
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.lines = asyncio.Queue()
+        self.waiting = False
+        self.last_input = self.loop.time()
+        threading.Thread(target=self._read, name="stdin-reader", daemon=True).start()
+
+    def _read(self):
+        while True:
+            line = sys.stdin.readline()
+            try:
+                self.loop.call_soon_threadsafe(self.lines.put_nowait, line or None)
+            except RuntimeError:
+                return  # the event loop is closed
+            if not line:
+                return
+
+    async def input(self, prompt=""):
+        """Like input(): print prompt and return the next line, raising EOFError at end of input."""
+        print(prompt, end="", flush=True)
+        self.waiting = True
+        try:
+            line = await self.lines.get()
+        finally:
+            self.waiting = False
+        self.last_input = self.loop.time()
+        if line is None:
+            raise EOFError
+        return line.rstrip("\n")
+
+
+def print_help():
     print("\nAvailable commands:")
     print("  start  - Begin a new activity session")
     print("  stop   - End the current session")
     print("  add    - Manually add a past activity")
     print("  stats  - View activity statistics")
+    print("  patterns - View hourly/weekday heatmap and daily/weekly trends")
+    print("  pending - Review sessions that could not be logged")
     print("  quit   - Exit the application\n")
-    print("  help   - Show available commands\n")
 
+async def read_time(console, label):
+    """Ask for a time as 'offset HH:MM' until it parses; return it as a datetime."""
     while True:
+        text = await console.input(f"{label} time (offset HH:MM): ")
         try:
-            command = input("> ").strip().lower()
+            offset_str, time_str = text.split()
+            offset = int(offset_str)
+            time = datetime.datetime.strptime(time_str, "%H:%M").time()
+            date = datetime.date.today() + datetime.timedelta(days=offset)
+            return datetime.datetime.combine(date, time)
+        except ValueError:
+            print(f"Invalid {label.lower()} time. Please use 'offset HH:MM' format.")
+
+async def review_pending(console, run):
+    """Walk through the pending sessions, logging, keeping or discarding each."""
+    entries = await run(lambda: pending_sessions().load())
+    if not entries:
+        print("No pending sessions.")
+        return
+    done = []
+    for entry in entries:
+        start = datetime.datetime.fromisoformat(entry["start_time"])
+        end = datetime.datetime.fromisoformat(entry["end_time"])
+        print(f"{start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}"
+              f"{' (' + entry['activity'] + ')' if entry['activity'] else ''}: "
+              f"not logged because {entry['reason']}.")
+        choice = (await console.input("Log it (l), keep it (k) or discard it (d)? ")).strip().lower()
+        if choice == 'l':
+            if end <= start:
+                print("It ends before it starts, so it can only be discarded.")
+                continue
+            activity = entry["activity"] or await get_activity(console, run)
+            if activity == 0:
+                continue
+            try:
+                await run(log_session, start, end, activity)
+            except (OSError, DaemonError) as e:
+                print(f"Session could not be logged: {e}")
+                continue
+            print("Session added successfully.")
+            done.append(entry)
+        elif choice == 'd':
+            done.append(entry)
+    if done:
+        await run(lambda: pending_sessions().remove(done))
+
+async def repl():
+    """Command loop. Reading a command never blocks, so meanwhile the running
+    session is checkpointed every CHECKPOINT_INTERVAL seconds and, once the
+    user has been idle for IDLE_DELAY seconds, stats are precomputed."""
+    import asyncio
+    import concurrent.futures
+    console = Console()
+    loop = asyncio.get_running_loop()
+    # One worker for everything that touches the store, so the background
+    # precompute never races a command
+    worker = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+
+    def run(func, *args):
+        return loop.run_in_executor(worker, func, *args)
+
+    # The daemon keeps the shared session itself, so only a local one is checkpointed
+    local = not isinstance(await run(open_log), DaemonClient)
+    session_start = None  # start of the running session, None while stopped
+    stats_days = list(PRECOMPUTE_DAYS)
+
+    async def checkpoint_loop():
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
+            if session_start is not None and local:
+                session_checkpoint().save(session_start)
+
+    async def precompute_loop():
+        precomputed = None
+        while True:
+            await asyncio.sleep(IDLE_DELAY)
+            if not console.waiting or loop.time() - console.last_input < IDLE_DELAY:
+                continue
+            try:
+                precomputed = await run(precompute_stats, list(stats_days), precomputed)
+            except Exception:
+                pass  # the stats command reports the error when it is used
+
+    print("Welcome to the Activity Stopwatch App.")
+    print_help()
+    print("  help   - Show available commands\n")
+
+    recovered = session_checkpoint().load() if local else None
+    if recovered:
+        start, saved, _ = recovered
+        print(f"A session started {start:%Y-%m-%d %H:%M} was still running when the app "
+              f"last exited (last saved {saved:%H:%M:%S}).")
+        choice = (await console.input("Resume it (r), log it until then (l) or discard it (d)? ")).strip().lower()
+        if choice == 'r':
+            session_start = start
+            print("Session resumed.")
+        elif choice == 'l':
+            activity = await get_activity(console, run)
+            if activity != 0 and await run(save_session, start, saved, activity):
+                print("Session added successfully.")
+            session_checkpoint().clear()
+        else:
+            session_checkpoint().clear()
+    waiting = len(pending_sessions())
+    if waiting:
+        print(f"{waiting} session(s) could not be logged earlier. Use 'pending' to review them.")
+
+    tasks = [loop.create_task(checkpoint_loop()), loop.create_task(precompute_loop())]
+    try:
+        while True:
+            command = (await console.input("> ")).strip().lower()
             if command == 'start':
-                if not is_running:
-                    start_time = datetime.datetime.now()
-                    is_running = True
-                    print("Session started.")
+                if session_start is None:
+                    session_start, already_running = await run(start_session)
+                    if local:
+                        session_checkpoint().save(session_start)
+                    if already_running:
+                        print(f"Session already running since {session_start:%H:%M:%S}.")
+                    else:
+                        print("Session started.")
                 else:
                     print("Session already running.")
             elif command == 'stop':
-                if is_running:
-                    end_time = datetime.datetime.now()
-                    is_running = False
+                if session_start is not None:
+                    try:
+                        start_time, end_time = await run(stop_session, session_start)
+                    except DaemonError as e:
+                        session_start = None
+                        print(f"Session could not be stopped: {e}")
+                        continue
+                    session_start = None
                     duration = (end_time - start_time).total_seconds() / 3600
                     print(f"Session ended. Duration: {duration:.2f} hours")
-                    activity = get_activity()
+                    activity = await get_activity(console, run)
                     if activity != 0:
-                        log_session(start_time, end_time, activity)
+                        await run(save_session, start_time, end_time, activity)
                     else:
                         print("Activity cancelled.")
+                    if local:
+                        session_checkpoint().clear()
                 else:
                     print("No session is running.")
             elif command == 'add':
                 print("For manual addition, enter times as 'offset HH:MM', where offset is 0 for today, -1 for yesterday, etc.")
-                while True:
-                    start_input = input("Start time (offset HH:MM): ")
-                    try:
-                        start_offset_str, start_time_str = start_input.split()
-                        start_offset = int(start_offset_str)
-                        start_time = datetime.datetime.strptime(start_time_str, "%H:%M").time()
-                        start_date = datetime.date.today() + datetime.timedelta(days=start_offset)
-                        start_datetime = datetime.datetime.combine(start_date, start_time)
-                        break
-                    except ValueError:
-                        print("Invalid start time. Please use 'offset HH:MM' format.")
-
-                while True:
-                    end_input = input("End time (offset HH:MM): ")
-                    try:
-                        end_offset_str, end_time_str = end_input.split()
-                        end_offset = int(end_offset_str)
-                        end_time = datetime.datetime.strptime(end_time_str, "%H:%M").time()
-                        end_date = datetime.date.today() + datetime.timedelta(days=end_offset)
-                        end_datetime = datetime.datetime.combine(end_date, end_time)
-                        break
-                    except ValueError:
-                        print("Invalid end time. Please use 'offset HH:MM' format.")
+                start_datetime = await read_time(console, "Start")
+                end_datetime = await read_time(console, "End")
 
                 if start_datetime < end_datetime:
-                    activity = get_activity()
-                    log_session(start_datetime, end_datetime, activity)
-                    print("Session added successfully.")
+                    conflict = await run(find_overlap, start_datetime, end_datetime)
+                    if conflict:
+                        print(f"Warning: this overlaps time already logged from "
+                              f"{conflict[0]:%Y-%m-%d %H:%M} to {conflict[1]:%Y-%m-%d %H:%M}.")
+                        if (await console.input("Add it anyway? (y/n): ")).strip().lower() != 'y':
+                            print("Session not added.")
+                            continue
+                    activity = await get_activity(console, run)
+                    if await run(save_session, start_datetime, end_datetime, activity):
+                        print("Session added successfully.")
                 else:
                     print("Start time must be before end time. Please try again.")
             elif command == 'stats':
-                days = int(input("Enter number of days: "))
-                get_stats(days)
+                days = int(await console.input("Enter number of days: "))
+                if days not in stats_days:
+                    stats_days[:] = (stats_days + [days])[-MAX_PRECOMPUTED:]
+                await run(profiling.profile_call, get_stats, days)
                 # open the stats.png file
                 os.startfile(STATS_OUTPUT_FILE)
+            elif command == 'patterns':
+                days = int(await console.input("Enter number of days: "))
+                await run(profiling.profile_call, get_patterns, days)
+            elif command == 'pending':
+                await review_pending(console, run)
             elif command == 'quit':
+                if session_start is not None and local:
+                    print("The running session is kept and will be offered again on the next start.")
                 print("Goodbye!")
                 break
             elif command == 'help':
-                print("\nAvailable commands:")
-                print("  start  - Begin a new activity session")
-                print("  stop   - End the current session")
-                print("  add    - Manually add a past activity")
-                print("  stats  - View activity statistics")
-                print("  quit   - Exit the application\n")
+                print_help()
             else:
                 print("Invalid command")
-        except KeyboardInterrupt:
-            print("\nExiting...")
-            break
+    except EOFError:
+        print()
+    finally:
+        for task in tasks:
+            task.cancel()
+        worker.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    """Main application loop."""
+    import asyncio
+    try:
+        asyncio.run(repl())
+    except KeyboardInterrupt:
+        print("\nExiting...")
 
 if __name__ == "__main__":
+    if "--profile" in sys.argv[1:]:
+        profiling.enable()
     OUTPUT_DIR = "outputs"
     ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), OUTPUT_DIR)
     CATEGORIES_FILE = os.path.join(ROOT_DIR, "categories.txt")
     ACTIVITY_LOG_FILE = os.path.join(ROOT_DIR, "activity_log.csv")
     STATS_OUTPUT_FILE = os.path.join(ROOT_DIR, "stats.png")
+    PATTERNS_OUTPUT_FILE = os.path.join(ROOT_DIR, "patterns.png")
     main()
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""Bulk import of sessions from external CSV and iCalendar (.ics) files.
+
+Usage: python importer.py [--into LOG] [--default-category NAME]
+                          [--batch-size N] [--rejects FILE] FILE [FILE ...]
+
+CSV files need start, end and activity columns, either headerless in that
+order (the activity_log.csv layout) or named by a header row (start/start_time,
+end/end_time, activity/category/summary). Calendar events use DTSTART, DTEND
+or DURATION, and SUMMARY as the activity; times with a TZID are converted to
+local time, and events in a time zone that is not known are rejected.
+Activities are matched case-insensitively against the category registry of
+LOG, categories.json and categories.txt; anything else is rejected unless
+--default-category is given. Accepted sessions are written to LOG (default
+activity_log.csv) in batches, one buffered append per batch, and rejected
+rows are listed in the rejects file, which is removed when nothing was
+rejected.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import re
+import time
+from category_registry import CategoryRegistry, registry_path_for
+from log_reader import parse_timestamp
+
+DEFAULT_BATCH_SIZE = 50000
+CATEGORY_FILES = ["categories.json", "categories.txt"]
+START_COLUMNS = ("start", "start_time", "begin", "dtstart")
+END_COLUMNS = ("end", "end_time", "finish", "dtend")
+ACTIVITY_COLUMNS = ("activity", "category", "summary", "title")
+DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$")
+
+
+def load_known_categories(paths=CATEGORY_FILES):
+    """Map lower-cased category names to their spelling in the category files."""
+    known = {}
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                if path.endswith(".json"):
+                    names = json.load(f)
+                else:
+                    names = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            continue
+        for name in names:
+            known.setdefault(name.lower(), name)
+    return known
+
+
+def normalize_timestamp(text):
+    """Return text as 'YYYY-MM-DD HH:MM:SS', or None if it is not a timestamp.
+
+    Values already in that layout are only checked by the C-implemented
+    fromisoformat and returned as-is, since fixed-width timestamps compare
+    correctly as strings.
+    """
+    text = text.strip()
+    if (len(text) == 19 and text[4] == '-' and text[7] == '-' and text[10] == ' '
+            and text[13] == ':' and text[16] == ':'):
+        try:
+            datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return None
+        return text
+    try:
+        value = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        value = parse_timestamp(text)
+        if value is None:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _header_columns(row):
+    """Return (start, end, activity) column positions if row is a header."""
+    header = [column.strip().lower() for column in row]
+    positions = []
+    for names in (START_COLUMNS, END_COLUMNS, ACTIVITY_COLUMNS):
+        match = next((header.index(n) for n in names if n in header), None)
+        if match is None:
+            return None
+        positions.append(match)
+    return tuple(positions)
+
+
+def iter_csv_rows(path):
+    """Yield (line number, start, end, activity, fields) from an external CSV."""
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        columns = _header_columns(first)
+        if columns is None:
+            columns = (0, 1, 2)
+            rows = itertools.chain([first], reader)
+            number = 1
+        else:
+            rows = reader
+            number = 2
+        start_col, end_col, activity_col = columns
+        width = max(columns) + 1
+        for number, row in enumerate(rows, number):
+            if len(row) < width:
+                yield number, None, None, None, row
+                continue
+            yield number, row[start_col], row[end_col], row[activity_col], row
+
+
+def _unfold(f):
+    """Join RFC 5545 folded lines, yielding (line number, logical line)."""
+    current = None
+    current_number = 0
+    for number, line in enumerate(f, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_number, current
+        current, current_number = line, number
+    if current is not None:
+        yield current_number, current
+
+
+def _ics_timezone(params):
+    """Return the zone named by a TZID parameter, None without one, or False if unknown."""
+    for param in params.split(";"):
+        key, _, value = param.partition("=")
+        if key.strip().upper() != "TZID":
+            continue
+        from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+        try:
+            return ZoneInfo(value.strip().strip('"'))
+        except (ZoneInfoNotFoundError, ValueError, OSError):
+            return False
+    return None
+
+
+def _ics_datetime(value, params):
+    if "VALUE=DATE" in params.upper() or len(value) == 8:
+        return None  # all-day events have no time span to track
+    if len(value) < 15 or value[8] != "T":
+        return None
+    text = f"{value[0:4]}-{value[4:6]}-{value[6:8]} {value[9:11]}:{value[11:13]}:{value[13:15]}"
+    zone = datetime.timezone.utc if value.endswith("Z") else _ics_timezone(params)
+    if zone is False:
+        return None  # a local time in a zone we cannot convert from
+    if zone is not None:
+        try:
+            aware = datetime.datetime.fromisoformat(text).replace(tzinfo=zone)
+        except ValueError:
+            return None
+        return aware.astimezone().replace(tzinfo=None).strftime("%Y-%m-%d %H:%M:%S")
+    return text
+
+
+def _ics_duration(value):
+    match = DURATION_PATTERN.match(value.strip())
+    if not match:
+        return None
+    parts = {k: int(v) for k, v in match.groupdict().items() if v}
+    return datetime.timedelta(**parts)
+
+
+def iter_ics_events(path):
+    """Yield (line number, start, end, activity, fields) for each VEVENT."""
+    with open(path, "r", encoding="utf-8") as f:
+        event = None
+        for number, line in _unfold(f):
+            if line == "BEGIN:VEVENT":
+                event = {"line": number}
+                continue
+            if event is None:
+                continue
+            if line == "END:VEVENT":
+                start = event.get("DTSTART")
+                end = event.get("DTEND")
+                if start and not end and event.get("DURATION"):
+                    duration = _ics_duration(event["DURATION"])
+                    if duration is not None:
+                        end = (datetime.datetime.fromisoformat(start) + duration).strftime("%Y-%m-%d %H:%M:%S")
+                yield (event["line"], start, end, event.get("SUMMARY", ""),
+                       [event.get("RAW_START", ""), event.get("RAW_END", ""), event.get("SUMMARY", "")])
+                event = None
+                continue
+            name, _, value = line.partition(":")
+            key, _, params = name.partition(";")
+            key = key.upper()
+            if key in ("DTSTART", "DTEND"):
+                event[key] = _ics_datetime(value, params)
+                event["RAW_" + key[2:]] = value
+            elif key in ("SUMMARY", "DURATION"):
+                event[key] = value.replace("\\,", ",").replace("\\;", ";").strip()
+
+
+def iter_source(path):
+    if path.lower().endswith((".ics", ".ical")):
+        yield from iter_ics_events(path)
+    else:
+        yield from iter_csv_rows(path)
+
+
+def known_name(activity, known, registry=None):
+    """Spelling of a known category, from the target log's registry first, or None."""
+    if registry is not None:
+        category_id = registry.lookup(activity or "")
+        if category_id is not None:
+            return registry.names[category_id]
+    return known.get((activity or "").strip().lower())
+
+
+def validate(rows, known, default_category=None, rejected=None, registry=None):
+    """Normalize rows into (start, end, activity) text tuples.
+
+    Invalid rows are appended to rejected as (line, reason, fields), with
+    the source fields joined back into one string.
+    """
+    for number, start, end, activity, fields in rows:
+        if start is None or end is None:
+            rejected.append((number, "missing start or end", ",".join(fields)))
+            continue
+        start = normalize_timestamp(start) if start else None
+        end = normalize_timestamp(end) if end else None
+        if start is None or end is None:
+            rejected.append((number, "invalid timestamp", ",".join(fields)))
+            continue
+        if end <= start:
+            rejected.append((number, "end is not after start", ",".join(fields)))
+            continue
+        name = known_name(activity, known, registry)
+        if name is None:
+            if default_category is None:
+                rejected.append((number, f"unknown category '{activity}'", ",".join(fields)))
+                continue
+            name = default_category
+        yield start, end, name
+
+
+def write_batch(path, batch, store=None):
+    """Append one batch of (start, end, activity) text tuples in a single write.
+
+    CSV logs are appended to directly; other targets go through store (opened
+    from path if not given), so journals intern category ids like any save.
+    """
+    if path.endswith(".csv"):
+        from activity_store import log_lock
+        with log_lock(path), open(path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{s},{e},{a}\n" for s, e, a in batch))
+        return
+    if store is None:
+        from activity_store import open_store
+        store = open_store(path)
+    if path.endswith(".jsonl"):
+        store.append_many([{"start_time": s.replace(" ", "T"), "end_time": e.replace(" ", "T"),
+                            "activity": a} for s, e, a in batch])
+    elif path.endswith(".bin"):
+        store.append_many((datetime.datetime.fromisoformat(s), datetime.datetime.fromisoformat(e), a)
+                          for s, e, a in batch)
+    else:
+        store.append_many({"start_time": s, "end_time": e, "activity": a} for s, e, a in batch)
+
+
+def import_files(paths, into, known, default_category=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Import every file into the log at `into`.
+
+    Returns (imported, rejected) where rejected lists (file, line, reason, row).
+    """
+    store = None
+    if into.endswith(".csv"):
+        registry = CategoryRegistry(registry_path_for(into))
+    else:
+        from activity_store import open_store
+        store = open_store(into)  # a journal cuts off a torn last record here
+        registry = store.registry
+    imported = 0
+    all_rejected = []
+    for path in paths:
+        rejected = []
+        batch = []
+        for session in validate(iter_source(path), known, default_category, rejected, registry):
+            batch.append(session)
+            if len(batch) >= batch_size:
+                write_batch(into, batch, store)
+                imported += len(batch)
+                batch = []
+        if batch:
+            write_batch(into, batch, store)
+            imported += len(batch)
+        all_rejected.extend((path,) + r for r in rejected)
+    if into.endswith(".csv"):
+        from stats_index import update_index
+        update_index(into)
+    return imported, all_rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import sessions from CSV or iCalendar files.")
+    parser.add_argument("files", nargs="+", help="CSV or .ics files to import")
+    parser.add_argument("--into", default="activity_log.csv",
+                        help="log or store to append to (default: activity_log.csv)")
+    parser.add_argument("--default-category",
+                        help="use this category instead of rejecting unknown ones")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--rejects", default="import_rejected.csv",
+                        help="where to list rejected rows (default: import_rejected.csv)")
+    args = parser.parse_args(argv)
+
+    known = load_known_categories()
+    default_category = None
+    if args.default_category:
+        registry = CategoryRegistry(registry_path_for(args.into))
+        default_category = known_name(args.default_category, known, registry) or args.default_category
+
+    started = time.perf_counter()
+    imported, rejected = import_files(args.files, args.into, known, default_category, args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"Imported {imported} sessions into {args.into} in {elapsed:.2f}s")
+    if rejected:
+        with open(args.rejects, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["file", "line", "reason", "row"])
+            writer.writerows(rejected)
+        print(f"Rejected {len(rejected)} rows, see {args.rejects}")
+    else:
+        try:
+            os.remove(args.rejects)  # left over from an earlier run
+        except FileNotFoundError:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
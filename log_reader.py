@@ -0,0 +1,87 @@
+import datetime
+import os
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Sessions are appended when they end, and manual entries may be backfilled a
+# little out of order, so window scans start this far before the window.
+DEFAULT_SLACK = datetime.timedelta(days=1)
+
+
+def parse_timestamp(text):
+    """Parse a 'YYYY-MM-DD HH:MM:SS' timestamp, or return None if invalid.
+
+    The fixed layout is checked by position and handed to the C-implemented
+    fromisoformat, which is several times faster than strptime. Anything that
+    does not match the layout falls back to strptime.
+    """
+    if (len(text) == 19 and text[4] == '-' and text[7] == '-' and text[10] == ' '
+            and text[13] == ':' and text[16] == ':'):
+        try:
+            return datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    try:
+        return datetime.datetime.strptime(text, TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def parse_line(line):
+    """Parse one raw CSV log line into (start, end, activity), or None."""
+    parts = line.decode("utf-8", "replace").strip().split(",")
+    if len(parts) != 3:
+        return None
+    start_str, end_str, activity = parts
+    start = parse_timestamp(start_str)
+    end = parse_timestamp(end_str)
+    if start is None or end is None:
+        return None
+    return start, end, activity
+
+
+def _line_start(f, pos):
+    """Return the offset of the first line starting at or after pos."""
+    if pos == 0:
+        return 0
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+
+def find_window_offset(f, since):
+    """Binary-search a time-ordered log for the first line starting at or after since.
+
+    Only O(log size) lines are read. Lines that cannot be parsed are treated as
+    older than the window.
+    """
+    size = f.seek(0, os.SEEK_END)
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos = _line_start(f, mid)
+        line = f.readline()
+        session = parse_line(line) if line else None
+        if not line or (session is not None and session[0] >= since):
+            hi = mid
+        else:
+            lo = mid + 1
+    return _line_start(f, lo)
+
+
+def iter_sessions(path, since=None, slack=DEFAULT_SLACK):
+    """Stream (start, end, activity) tuples from a CSV log.
+
+    When since is given the reader seeks straight to the window instead of
+    reading the file from the top; sessions older than since are still
+    yielded if they sit within the slack margin. Memory use is constant
+    regardless of the log size.
+    """
+    with open(path, "rb") as f:
+        if since is not None:
+            f.seek(find_window_offset(f, since - slack))
+        for line in f:
+            session = parse_line(line)
+            if session is not None:
+                yield session
+
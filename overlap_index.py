@@ -0,0 +1,344 @@
+import bisect
+import datetime
+import heapq
+import json
+import os
+import threading
+from activity_store import CsvLog, log_lock, open_store
+from stats_index import open_index
+
+INTERVALS_SUFFIX = ".intervals.json"
+INTERVALS_DELTA_SUFFIX = ".intervals.delta"
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# How far back in the log a session may have been backfilled and still be
+# merged by compact_log; anything older is passed through unmerged
+DEFAULT_HORIZON = datetime.timedelta(days=7)
+
+# Once the delta file outgrows this, the next add writes a new snapshot
+COMPACT_BYTES = 256 * 1024
+
+_open_indexes = {}
+_open_indexes_lock = threading.Lock()
+
+
+def to_seconds(dt):
+    return int((dt - EPOCH).total_seconds())
+
+
+def from_seconds(seconds):
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+class OverlapIndex:
+    """Time already covered by a store's sessions, as disjoint sorted intervals.
+
+    Overlapping sessions are merged into one interval, so whether a new
+    session overlaps anything is decided by looking at a single neighbour
+    found with bisect, in O(log n). The intervals are saved next to the log
+    together with the store version they describe, and rebuilt from the
+    store when that version no longer matches.
+
+    Like the rollup index, the intervals are saved as a snapshot plus a delta
+    file: add() appends one JSON line with the session and the store versions
+    before and after it, and the snapshot is only rewritten once the delta
+    passes COMPACT_BYTES. A delta is applied only if it starts at the version
+    the intervals describe.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.path = store.path + INTERVALS_SUFFIX
+        self.delta_path = store.path + INTERVALS_DELTA_SUFFIX
+        self.lock = threading.RLock()
+        self.load()
+        self.sync()
+
+    def load(self):
+        self.starts = []
+        self.ends = []
+        self.version = None
+        self._snapshot = _file_stamp(self.path)
+        self._delta_read = 0
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.starts, self.ends, self.version = data["starts"], data["ends"], data["version"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        self.apply_deltas()
+
+    def apply_deltas(self):
+        """Fold in the sessions added since we last looked, by any process."""
+        try:
+            f = open(self.delta_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size < self._delta_read:
+                self._delta_read = 0  # compacted and started over
+            f.seek(self._delta_read)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._delta_read += len(line)
+                try:
+                    delta = json.loads(line)
+                    if delta["from"] != self.version:
+                        continue
+                    self._insert(*delta["add"])
+                    self.version = delta["to"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def _store_version(self):
+        # Normalise tuples to lists so it compares equal to the saved copy
+        return json.loads(json.dumps(self.store.version()))
+
+    def save(self):
+        """Write a full snapshot and drop the deltas it now contains."""
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.version, "starts": self.starts, "ends": self.ends}, f)
+        os.replace(tmp_path, self.path)
+        try:
+            os.remove(self.delta_path)
+        except FileNotFoundError:
+            pass
+        self._snapshot = _file_stamp(self.path)
+        self._delta_read = 0
+
+    def save_delta(self, previous, s, e):
+        line = json.dumps({"from": previous, "to": self.version, "add": [s, e]},
+                          separators=(",", ":")) + "\n"
+        with open(self.delta_path, "a") as f:
+            f.write(line)
+            size = f.tell()
+        if size >= COMPACT_BYTES:
+            self.save()
+        else:
+            self._delta_read = size
+
+    def sync(self):
+        """Rebuild the intervals if the store changed behind our back."""
+        with self.lock:
+            if _file_stamp(self.path) != self._snapshot:
+                self.load()  # rebuilt or compacted elsewhere
+            else:
+                self.apply_deltas()
+            version = self._store_version()
+            if version == self.version:
+                return
+            self._rebuild(version)
+
+    def _rebuild(self, version):
+        import numpy as np  # only needed for the rebuild
+
+        try:
+            columns = self.store.columns()
+        except FileNotFoundError:
+            # Nothing has been logged yet
+            self.starts, self.ends, self.version = [], [], version
+            return
+        order = np.argsort(columns.start, kind="stable")
+        start = np.asarray(columns.start)[order]
+        end = np.asarray(columns.end)[order]
+        keep = end > start
+        start, end = start[keep], end[keep]
+        if len(start):
+            # A new interval begins wherever a start is past every earlier end
+            running_end = np.maximum.accumulate(end)
+            begins = np.concatenate(([True], start[1:] > running_end[:-1]))
+            group_ends = np.concatenate((np.flatnonzero(begins)[1:] - 1, [len(start) - 1]))
+            self.starts = start[begins].tolist()
+            self.ends = running_end[group_ends].tolist()
+        else:
+            self.starts, self.ends = [], []
+        self.version = version
+        self.save()
+
+    def find(self, start, end):
+        """Return (start, end) datetimes of covered time overlapping [start, end), or None."""
+        s, e = to_seconds(start), to_seconds(end)
+        with self.lock:
+            i = bisect.bisect_left(self.starts, e) - 1
+            if i >= 0 and self.ends[i] > s:
+                return from_seconds(self.starts[i]), from_seconds(self.ends[i])
+        return None
+
+    def check(self, start, end):
+        """Sync with the store, then look for an overlap with [start, end)."""
+        self.sync()
+        return self.find(start, end)
+
+    def _insert(self, s, e):
+        lo = bisect.bisect_left(self.ends, s)
+        hi = bisect.bisect_right(self.starts, e)
+        if lo < hi:
+            s = min(s, self.starts[lo])
+            e = max(e, self.ends[hi - 1])
+        self.starts[lo:hi] = [s]
+        self.ends[lo:hi] = [e]
+
+    def add(self, start, end):
+        """Record a session that was just appended to the store."""
+        s, e = to_seconds(start), to_seconds(end)
+        with self.lock:
+            previous = self.version
+            self._insert(s, e)
+            self.version = self._store_version()
+            self.save_delta(previous, s, e)
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def open_overlap_index(store):
+    """Return the store's own overlap index if it keeps one, else an OverlapIndex.
+
+    The daemon client keeps its index in the daemon, so adding to it locally
+    would only duplicate work and race with other clients. Other stores share
+    one OverlapIndex per log for the process lifetime.
+    """
+    factory = getattr(store, "overlap_index", None)
+    if factory is not None:
+        return factory()
+    key = os.path.abspath(store.path)
+    with _open_indexes_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = _open_indexes[key] = OverlapIndex(store)
+    return index
+
+
+def remove_overlap_index(log_path):
+    """Delete the saved intervals of a rewritten log; they are rebuilt on next use."""
+    for path in (log_path + INTERVALS_SUFFIX, log_path + INTERVALS_DELTA_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def compact_sessions(sessions, horizon=DEFAULT_HORIZON, stats=None):
+    """Merge duplicate and overlapping same-activity sessions from a stream.
+
+    sessions yields (start, end, activity) roughly in start order; a reorder
+    buffer absorbs sessions that were logged up to `horizon` out of order, so
+    memory is bounded by the sessions within that horizon rather than by the
+    log size. Yields the merged sessions in start order. Sessions that arrive
+    later than the horizon allows are passed through unmerged. Overlaps
+    between different activities are left alone.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(read=0, written=0, merged=0, late=0)
+    pending = []   # reorder buffer: (start, seq, end, activity)
+    ready = []     # merged sessions waiting to be written in start order
+    open_sessions = {}  # activity -> [start, end] still being extended
+    released = None
+    seq = 0
+
+    def release(session):
+        start, _, end, activity = session
+        current = open_sessions.get(activity)
+        if current is not None and start <= current[1]:
+            current[1] = max(current[1], end)
+            stats["merged"] += 1
+            return
+        if current is not None:
+            heapq.heappush(ready, (current[0], id(current), current[1], activity))
+        open_sessions[activity] = [start, end]
+
+    for start, end, activity in sessions:
+        stats["read"] += 1
+        seq += 1
+        if released is not None and start < released:
+            stats["late"] += 1
+            heapq.heappush(ready, (start, seq, end, activity))
+        else:
+            heapq.heappush(pending, (start, seq, end, activity))
+        while pending and pending[0][0] <= start - horizon:
+            session = heapq.heappop(pending)
+            released = session[0]
+            release(session)
+        # Sessions released from now on start at or after `released`, so an
+        # open session ending before it can no longer be extended
+        if released is not None:
+            for name, current in list(open_sessions.items()):
+                if current[1] < released:
+                    heapq.heappush(ready, (current[0], id(current), current[1], name))
+                    del open_sessions[name]
+        # Nothing released later can start before the oldest open session
+        watermark = min((s for s, _ in open_sessions.values()), default=released)
+        while ready and watermark is not None and ready[0][0] < watermark:
+            s, _, e, a = heapq.heappop(ready)
+            stats["written"] += 1
+            yield s, e, a
+
+    while pending:
+        release(heapq.heappop(pending))
+    for activity, (s, e) in open_sessions.items():
+        heapq.heappush(ready, (s, id(activity), e, activity))
+    while ready:
+        s, _, e, a = heapq.heappop(ready)
+        stats["written"] += 1
+        yield s, e, a
+
+
+def compact_log(log_path, output_path=None, horizon=DEFAULT_HORIZON):
+    """Rewrite a CSV or journal log with merged, de-duplicated sessions.
+
+    The log is streamed through compact_sessions into a temporary file that
+    then replaces the output (the log itself by default). Sidecar indexes of
+    the rewritten log are rebuilt. The log is locked meanwhile, so appends
+    from other processes wait for the new log (see log_lock). Returns the
+    compaction statistics.
+    """
+    output_path = output_path or log_path
+    store = open_store(log_path)
+    if not isinstance(store, CsvLog) and not log_path.endswith(".jsonl"):
+        raise ValueError("compaction only supports .csv and .jsonl logs")
+    # Appends wait until the new log is in place instead of going to the old one
+    with log_lock(log_path, exclusive=True):
+        sessions = (
+            (datetime.datetime.fromisoformat(a['start_time']),
+             datetime.datetime.fromisoformat(a['end_time']),
+             a['activity'])
+            for a in store)
+        stats = {}
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for start, end, activity in compact_sessions(sessions, horizon, stats):
+                if output_path.endswith(".csv"):
+                    f.write(f"{start.strftime('%Y-%m-%d %H:%M:%S')},{end.strftime('%Y-%m-%d %H:%M:%S')},{activity}\n")
+                else:
+                    f.write(json.dumps({
+                        "start_time": start.isoformat(),
+                        "end_time": end.isoformat(),
+                        "activity": activity
+                    }, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+
+        open_index(output_path).rebuild()
+        remove_overlap_index(output_path)
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) not in (3, 4) or sys.argv[1] != "compact":
+        print("Usage: python overlap_index.py compact <log file> [output file]")
+        sys.exit(1)
+    output = sys.argv[3] if len(sys.argv) == 4 else None
+    stats = compact_log(sys.argv[2], output)
+    print(f"Read {stats['read']} sessions, merged {stats['merged']}, "
+          f"wrote {stats['written']} ({stats['late']} too far out of order to merge)")
@@ -0,0 +1,51 @@
+import concurrent.futures
+import os
+
+# Below this size the process pool costs more than it saves
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+
+def chunk_offsets(path, chunks):
+    """Split a file into up to `chunks` newline-aligned (start, end) byte ranges."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, chunks):
+            f.seek(size * i // chunks)
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    bounds = sorted(set(bounds))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _aggregate_chunk(path, start, end):
+    from analytics import daily_buckets, load_csv_columns
+
+    columns = load_csv_columns(path, byte_range=(start, end))
+    return len(columns), columns.offset, daily_buckets(columns)
+
+
+def parallel_daily_buckets(path, workers=None):
+    """Bucket a CSV log per (day, category) using one process per chunk.
+
+    Returns (records, offset, buckets) where offset is the end of the last
+    complete line and buckets maps (epoch day number, category) to seconds,
+    exactly as analytics.daily_buckets does for the whole file.
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = chunk_offsets(path, workers)
+    if not ranges:
+        return 0, 0, {}
+    records = 0
+    offset = 0
+    buckets = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_aggregate_chunk, path, start, end) for start, end in ranges]
+        # Reduce in file order so the result matches the serial path
+        for future in futures:
+            count, offset, partial = future.result()
+            records += count
+            for key, seconds in partial.items():
+                buckets[key] = buckets.get(key, 0) + seconds
+    return records, offset, buckets
@@ -0,0 +1,122 @@
+from profiling import traced
+
+
+def load_pyplot(headless=False):
+    """Import matplotlib.pyplot on first use.
+
+    matplotlib is only needed by the stats views, so importing it here keeps
+    it off the startup path. headless selects the non-interactive Agg backend
+    for callers that only write a PNG.
+    """
+    import matplotlib
+    if headless:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+@traced("render.pie", lambda png: {"bytes": len(png)})
+def render_pie_png(totals, title, figsize=(6, 5), dpi=100):
+    """Render a pie chart of hours per activity and return it as PNG bytes.
+
+    This uses the object-oriented Figure API instead of pyplot, which keeps
+    no global state and is therefore safe to call from a worker thread.
+    """
+    import io
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    labels = sorted(totals)
+    ax.pie([totals[a] for a in labels], labels=labels, autopct='%1.1f%%')
+    ax.set_title(title)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+@traced("render.bar_pie", lambda png: {"bytes": len(png)})
+def render_bar_pie_png(totals, title, bar_title="Bar Chart", pie_title="Pie Chart"):
+    """Render the bar + pie summary of hours per activity as PNG bytes."""
+    import io
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Prepare data for plotting
+    sorted_activities = sorted(totals.keys())
+    times = [totals[act] for act in sorted_activities]
+
+    # Bar chart on the left subplot
+    ax1.bar(sorted_activities, times)
+    ax1.set_xlabel("Activity")
+    ax1.set_ylabel("Hours")
+    ax1.set_title(bar_title)
+
+    # Pie chart on the right subplot
+    ax2.pie(times, labels=sorted_activities, autopct='%1.1f%%')
+    ax2.set_title(pie_title)
+
+    fig.suptitle(title)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+@traced("render.patterns", lambda png: {"bytes": len(png)})
+def render_patterns_png(hist, title, figsize=(12, 10), dpi=100):
+    """Render an hour x weekday heatmap plus daily and weekly series as PNG bytes.
+
+    hist is an analytics.Histograms; all views are shown in hours.
+    """
+    import io
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax1, ax2, ax3 = fig.subplots(3, 1)
+
+    # Hour-of-day x weekday heatmap across all categories
+    image = ax1.imshow(hist.heatmap.sum(axis=0) / 3600, aspect='auto', cmap='Blues')
+    ax1.set_yticks(range(7))
+    ax1.set_yticklabels(WEEKDAY_NAMES)
+    ax1.set_xticks(range(0, 24, 2))
+    ax1.set_xlabel("Hour of day")
+    ax1.set_title("Tracked hours by weekday and hour")
+    fig.colorbar(image, ax=ax1, label="Hours")
+
+    # Daily series, one line per category
+    days = hist.days()
+    for i, category in enumerate(hist.categories):
+        if hist.daily[:, i].any():
+            ax2.plot(days, hist.daily[:, i] / 3600, label=category)
+    ax2.set_ylabel("Hours per day")
+    ax2.set_title("Daily time per activity")
+    if len(days):
+        ax2.legend(loc='upper left', fontsize='small')
+
+    # Weekly totals, stacked per category
+    weeks = hist.weeks()
+    bottom = [0.0] * len(weeks)
+    for i, category in enumerate(hist.categories):
+        hours = hist.weekly[:, i] / 3600
+        if hours.any():
+            ax3.bar(weeks, hours, width=6, align='edge', bottom=bottom, label=category)
+            bottom = [b + h for b, h in zip(bottom, hours)]
+    ax3.set_ylabel("Hours per week")
+    ax3.set_title("Weekly time per activity")
+
+    fig.suptitle(title)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
@@ -0,0 +1,167 @@
+"""Opt-in timing instrumentation for the load, parse, aggregate and render paths.
+
+Set ACTIVITY_PROFILE to a trace file (or to 1 for profile_trace.jsonl), or
+pass --profile to a front-end, to record one JSON line per instrumented step:
+
+    {"name": "load.csv", "wall_ms": 12.3, "cpu_ms": 11.9, "bytes": 81920, "records": 1500, ...}
+
+A summary table per step name is printed when the program exits. Set
+ACTIVITY_CPROFILE to a file name to also dump a cProfile of the first stats
+call made through profile_call. When profiling is off, span() returns a
+shared no-op object, so instrumented code pays only for a function call.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+TRACE_ENV = "ACTIVITY_PROFILE"
+CPROFILE_ENV = "ACTIVITY_CPROFILE"
+DEFAULT_TRACE_FILE = "profile_trace.jsonl"
+
+_trace = None
+_summary = {}  # name -> [calls, wall, cpu, bytes, records]
+_lock = threading.Lock()
+_cprofile_done = False
+
+
+class Span:
+    """Times one step; extra fields such as bytes and records are set via set()."""
+
+    __slots__ = ("name", "fields", "wall", "cpu")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.wall, time.process_time() - self.cpu,
+               self.fields)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def enable(path=DEFAULT_TRACE_FILE):
+    """Start writing the trace to path and print the summary at exit."""
+    global _trace
+    if _trace is not None:
+        return
+    _trace = open(path, "a", encoding="utf-8")
+    atexit.register(print_summary)
+
+
+def enabled():
+    return _trace is not None
+
+
+def span(name, **fields):
+    """Context manager timing the step called name, e.g. 'load.csv'."""
+    if _trace is None:
+        return NULL_SPAN
+    return Span(name, fields)
+
+
+def traced(name, measure=None):
+    """Decorator timing every call of a function as a span called name.
+
+    measure(result) may return extra fields for the trace, e.g. records.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _trace is None:
+                return func(*args, **kwargs)
+            with Span(name, {}) as s:
+                result = func(*args, **kwargs)
+                if measure is not None:
+                    s.set(**measure(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def record(name, wall, cpu, fields):
+    """Append one step to the trace and the summary; wall and cpu are seconds.
+
+    CPU time is process-wide, so steps running next to another busy thread
+    are charged for it too.
+    """
+    entry = {
+        "ts": time.time(),
+        "name": name,
+        "thread": threading.current_thread().name,
+        "wall_ms": round(wall * 1000, 3),
+        "cpu_ms": round(cpu * 1000, 3),
+    }
+    entry.update(fields)
+    with _lock:
+        if _trace is None:
+            return
+        _trace.write(json.dumps(entry, default=str) + "\n")
+        _trace.flush()
+        totals = _summary.setdefault(name, [0, 0.0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += cpu
+        totals[3] += fields.get("bytes", 0)
+        totals[4] += fields.get("records", 0)
+
+
+def summary_table():
+    """Return the per-step totals as a text table, slowest steps first."""
+    rows = [f"{'step':<24}{'calls':>7}{'wall ms':>11}{'cpu ms':>11}{'bytes':>13}{'records':>10}"]
+    with _lock:
+        items = sorted(_summary.items(), key=lambda item: -item[1][1])
+    for name, (calls, wall, cpu, nbytes, records) in items:
+        rows.append(f"{name:<24}{calls:>7}{wall * 1000:>11.1f}{cpu * 1000:>11.1f}"
+                    f"{nbytes:>13}{records:>10}")
+    return "\n".join(rows)
+
+
+def print_summary():
+    if _summary:
+        print(summary_table())
+
+
+def profile_call(func, *args, **kwargs):
+    """Call func, under cProfile the first time if ACTIVITY_CPROFILE is set."""
+    global _cprofile_done
+    path = os.environ.get(CPROFILE_ENV)
+    if not path or _cprofile_done:
+        return func(*args, **kwargs)
+    import cProfile
+    _cprofile_done = True
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+
+
+if os.environ.get(TRACE_ENV):
+    enable(DEFAULT_TRACE_FILE if os.environ[TRACE_ENV] == "1" else os.environ[TRACE_ENV])
@@ -0,0 +1,162 @@
+"""Headless batch report over many activity logs.
+
+Usage: python report.py [--days N] [--out DIR] [--workers N] [--no-charts]
+                        [--profile [TRACE]] PATH [PATH ...]
+
+PATH may be a log file (.csv, .json or .jsonl) or a directory that is searched
+recursively for logs; sidecar and settings files are skipped, and so is a
+legacy .json log next to the .jsonl journal it was migrated into. Each file is parsed and aggregated in a worker process;
+the per-day, per-category partial results are merged and written to DIR as
+CSV and JSON summaries plus a chart.
+"""
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import json
+import os
+import time
+from category_registry import REGISTRY_SUFFIX
+from exporter import STATE_FILE
+from overlap_index import INTERVALS_SUFFIX
+from profiling import DEFAULT_TRACE_FILE, enable as enable_profiling, span
+from segments import SEGMENT_EXTENSION
+from session_checkpoint import CHECKPOINT_SUFFIX, PENDING_SUFFIX
+from stats_index import INDEX_SUFFIX
+
+LOG_EXTENSIONS = (".csv", ".json", ".jsonl")
+# Files the stores keep next to a log; some of them end like a log
+SIDECAR_SUFFIXES = (INDEX_SUFFIX, INTERVALS_SUFFIX, REGISTRY_SUFFIX, PENDING_SUFFIX,
+                    CHECKPOINT_SUFFIX, SEGMENT_EXTENSION)
+# Other files of ours that end like a log but hold no sessions
+NON_LOG_FILES = {"categories.json", STATE_FILE, DEFAULT_TRACE_FILE,
+                 "bench_results.json", "import_rejected.csv"}
+EPOCH_DAY = datetime.date(1970, 1, 1)
+
+
+def find_logs(paths):
+    """Expand files and directories into a sorted list of log files."""
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                names = set(filenames)
+                for name in filenames:
+                    # Skip our own sidecar files such as the rollup index
+                    if (not name.endswith(LOG_EXTENSIONS) or name.endswith(SIDECAR_SUFFIXES)
+                            or name in NON_LOG_FILES):
+                        continue
+                    # A legacy JSON log stays behind once open_journal migrated it
+                    if name.endswith(".json") and name + "l" in names:
+                        continue
+                    logs.append(os.path.join(dirpath, name))
+        elif os.path.isfile(path):
+            logs.append(path)
+    return sorted(set(logs))
+
+
+def aggregate_file(path, first_day=None, last_day=None):
+    """Worker: return (records, {(day, activity): seconds}) for one log file.
+
+    first_day and last_day are optional inclusive ISO date bounds.
+    """
+    from analytics import daily_buckets, load_columns
+
+    columns = load_columns(path)
+    low = high = None
+    if first_day is not None:
+        low = (datetime.date.fromisoformat(first_day) - EPOCH_DAY).days
+    if last_day is not None:
+        high = (datetime.date.fromisoformat(last_day) - EPOCH_DAY).days
+    daily = {}
+    for (day_number, activity), seconds in daily_buckets(columns).items():
+        if (low is not None and day_number < low) or (high is not None and day_number > high):
+            continue
+        day = (EPOCH_DAY + datetime.timedelta(days=day_number)).isoformat()
+        daily[(day, activity)] = seconds
+    return len(columns), daily
+
+
+def merge(partials):
+    """Combine per-file partial results into (records, daily, totals)."""
+    records = 0
+    daily = {}
+    for count, partial in partials:
+        records += count
+        for key, seconds in partial.items():
+            daily[key] = daily.get(key, 0) + seconds
+    totals = {}
+    for (_, activity), seconds in daily.items():
+        totals[activity] = totals.get(activity, 0) + seconds
+    return records, daily, totals
+
+
+def run_report(paths, days=None, workers=None):
+    logs = find_logs(paths)
+    first_day = last_day = None
+    if days is not None:
+        today = datetime.date.today()
+        first_day = (today - datetime.timedelta(days=days - 1)).isoformat()
+        last_day = today.isoformat()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(aggregate_file, logs,
+                                 [first_day] * len(logs), [last_day] * len(logs)))
+    return logs, merge(partials)
+
+
+def write_report(out_dir, logs, records, daily, totals, charts=True):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "totals.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["activity", "hours"])
+        for activity in sorted(totals):
+            writer.writerow([activity, f"{totals[activity] / 3600:.4f}"])
+    with open(os.path.join(out_dir, "daily.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["day", "activity", "hours"])
+        for day, activity in sorted(daily):
+            writer.writerow([day, activity, f"{daily[(day, activity)] / 3600:.4f}"])
+    with open(os.path.join(out_dir, "report.json"), "w") as f:
+        json.dump({
+            "files": logs,
+            "records": records,
+            "totals_hours": {a: totals[a] / 3600 for a in sorted(totals)},
+        }, f, indent=2)
+    if charts and totals:
+        from plotting import render_bar_pie_png
+        png = render_bar_pie_png({a: s / 3600 for a, s in totals.items()},
+                                 f"Time spent across {len(logs)} logs")
+        with open(os.path.join(out_dir, "stats.png"), "wb") as f:
+            f.write(png)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate many activity logs into a report.")
+    parser.add_argument("paths", nargs="+", help="log files or directories to scan")
+    parser.add_argument("--days", type=int, help="only include the last N days")
+    parser.add_argument("--out", default="report", help="output directory (default: report)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--no-charts", action="store_true", help="skip rendering stats.png")
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_TRACE_FILE, metavar="TRACE",
+                        help=f"write a timing trace (default: {DEFAULT_TRACE_FILE})")
+    args = parser.parse_args(argv)
+    if args.profile:
+        enable_profiling(args.profile)
+
+    started = time.perf_counter()
+    with span("aggregate.report") as s:
+        logs, (records, daily, totals) = run_report(args.paths, args.days, args.workers)
+        s.set(records=records)
+    elapsed = time.perf_counter() - started
+    if not logs:
+        print("No log files found.")
+        return 1
+    write_report(args.out, logs, records, daily, totals, charts=not args.no_charts)
+    print(f"Aggregated {records} records from {len(logs)} files in {elapsed:.2f}s "
+          f"({records / elapsed:,.0f} records/sec)")
+    print(f"Report written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
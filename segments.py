@@ -0,0 +1,266 @@
+import datetime
+import json
+import os
+from profiling import traced
+
+SEGMENTS_SUFFIX = ".segments"
+SEGMENT_EXTENSION = ".seg"
+SEGMENT_FORMAT = 1
+EPOCH = datetime.datetime(1970, 1, 1)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def segments_dir_for(log_path):
+    """Return the directory holding the archived segments of a log."""
+    return log_path + SEGMENTS_SUFFIX
+
+
+def period_key(dt, granularity="year"):
+    """Return the segment a session starting at dt belongs to, e.g. '2024' or '2024-03'."""
+    if granularity == "month":
+        return f"{dt.year:04d}-{dt.month:02d}"
+    return f"{dt.year:04d}"
+
+
+def to_seconds(dt):
+    return int((dt - EPOCH).total_seconds())
+
+
+def read_header(path):
+    """Return the JSON header of a segment without decompressing its sessions."""
+    with open(path, "rb") as f:
+        return json.loads(f.readline())
+
+
+def iter_segment(path):
+    """Yield (start, end, activity) text fields of every session in a segment."""
+    import gzip  # only needed once a segment is actually read
+    with open(path, "rb") as f:
+        f.readline()  # header
+        with gzip.GzipFile(fileobj=f, mode="rb") as body:
+            for line in body:
+                start, end, activity = line.decode("utf-8").rstrip("\n").split(",", 2)
+                yield start, end, activity
+
+
+class SegmentWriter:
+    """Collects the sessions of one period and writes them as a segment.
+
+    A segment is a single JSON header line -- first start and last end as
+    epoch seconds, session count and seconds per activity -- followed by a
+    gzip stream of 'start,end,activity' lines. The header can be read on its
+    own, so queries decide whether to skip a segment or use its totals
+    without decompressing it.
+    """
+
+    def __init__(self, path, period):
+        import gzip
+        self.path = path
+        self.period = period
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.body_path = self.tmp_path + ".body"
+        self.body = gzip.open(self.body_path, "wb")
+        self.first_start = None
+        self.last_end = None
+        self.count = 0
+        self.totals = {}
+
+    def add(self, start, end, activity):
+        """Add one session given as datetimes."""
+        self.body.write(f"{start.strftime(TIMESTAMP_FORMAT)},{end.strftime(TIMESTAMP_FORMAT)},{activity}\n"
+                        .encode("utf-8"))
+        s, e = to_seconds(start), to_seconds(end)
+        self.first_start = s if self.first_start is None else min(self.first_start, s)
+        self.last_end = e if self.last_end is None else max(self.last_end, e)
+        self.count += 1
+        if e > s:
+            self.totals[activity] = self.totals.get(activity, 0) + (e - s)
+
+    def finish(self):
+        """Write header and body to a temporary file; commit() moves it into place."""
+        self.body.close()
+        header = {
+            "format": SEGMENT_FORMAT,
+            "period": self.period,
+            "first_start": self.first_start,
+            "last_end": self.last_end,
+            "count": self.count,
+            "totals": self.totals
+        }
+        with open(self.tmp_path, "wb") as out, open(self.body_path, "rb") as body:
+            out.write(json.dumps(header, separators=(",", ":")).encode("utf-8") + b"\n")
+            while True:
+                chunk = body.read(1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.remove(self.body_path)
+
+    def commit(self):
+        os.replace(self.tmp_path, self.path)
+
+
+class SegmentSet:
+    """The archived segments of a log, described by their headers."""
+
+    def __init__(self, log_path):
+        self.directory = segments_dir_for(log_path)
+        self.segments = []  # (path, header)
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(SEGMENT_EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                header = read_header(path)
+            except (OSError, ValueError):
+                continue
+            if header.get("format") == SEGMENT_FORMAT and header["count"]:
+                self.segments.append((path, header))
+
+    def __len__(self):
+        return len(self.segments)
+
+    def overlapping(self, since=None, until=None):
+        """Yield (path, header, fully_covered) for segments touching [since, until)."""
+        for path, header in self.segments:
+            if since is not None and header["last_end"] <= since:
+                continue
+            if until is not None and header["first_start"] >= until:
+                continue
+            covered = ((since is None or header["first_start"] >= since)
+                       and (until is None or header["last_end"] <= until))
+            yield path, header, covered
+
+    @traced("aggregate.segment_totals")
+    def totals(self, since=None, until=None):
+        """Return hours per activity within [since, until), given as epoch seconds.
+
+        Segments entirely outside the window are skipped and segments entirely
+        inside it contribute their header totals; only segments crossing an
+        edge of the window are decompressed and clipped.
+        """
+        total_time = {}
+        for path, header, covered in self.overlapping(since, until):
+            if covered:
+                hours = {a: seconds / 3600 for a, seconds in header["totals"].items()}
+            else:
+                hours = load_segment_columns(path).totals(since, until)
+            for activity, value in hours.items():
+                total_time[activity] = total_time.get(activity, 0) + value
+        return total_time
+
+    def columns(self, since=None):
+        """Return SessionColumns for every segment overlapping the window from since."""
+        return [load_segment_columns(path)
+                for path, _, _ in self.overlapping(since)]
+
+
+def load_segment_columns(path):
+    from analytics import _build_columns  # numpy is only needed for partial segments
+    starts, ends, names = [], [], []
+    for start, end, activity in iter_segment(path):
+        starts.append(start)
+        ends.append(end)
+        names.append(activity)
+    return _build_columns(starts, ends, names, 0)
+
+
+def archived_totals(log_path, start_date, end_date):
+    """Hours per activity from the archived segments of a log within [start_date, end_date)."""
+    segments = SegmentSet(log_path)
+    if not segments:
+        return {}
+    return segments.totals(to_seconds(start_date), to_seconds(end_date))
+
+
+def archive_log(log_path, granularity="year", today=None):
+    """Move sessions of closed periods out of a CSV or journal log into segments.
+
+    A period (year or month) is closed once today lies past it; sessions are
+    assigned to the period they start in. Sessions of a period that already
+    has a segment, e.g. backfilled later, are merged into a rewritten copy of
+    that segment. The remaining sessions are written to a new hot log that
+    replaces the old one. Segments are moved into place before the log, so an
+    interruption can at worst leave sessions in both, never in neither. The
+    log is locked meanwhile, so appends from other processes wait for the new
+    log (see activity_store.log_lock). Returns {period: sessions archived}.
+    """
+    from activity_store import CsvLog, log_lock, open_store
+    from overlap_index import remove_overlap_index
+    from stats_index import open_index
+
+    store = open_store(log_path)
+    if not isinstance(store, CsvLog) and not log_path.endswith(".jsonl"):
+        raise ValueError("archiving only supports .csv and .jsonl logs")
+    if today is None:
+        today = datetime.date.today()
+    current = period_key(today, granularity)
+    directory = segments_dir_for(log_path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Appends wait until the new log is in place instead of going to the old one
+    with log_lock(log_path, exclusive=True):
+        writers = {}
+        archived = {}
+        tmp_path = f"{log_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as hot:
+            for activity in store:
+                start = datetime.datetime.fromisoformat(activity['start_time'])
+                end = datetime.datetime.fromisoformat(activity['end_time'])
+                period = period_key(start, granularity)
+                if period >= current:
+                    if log_path.endswith(".csv"):
+                        hot.write(f"{start.strftime(TIMESTAMP_FORMAT)},{end.strftime(TIMESTAMP_FORMAT)},"
+                                  f"{activity['activity']}\n")
+                    else:
+                        hot.write(json.dumps(activity, separators=(",", ":")) + "\n")
+                    continue
+                writer = writers.get(period)
+                if writer is None:
+                    writer = writers[period] = SegmentWriter(
+                        os.path.join(directory, period + SEGMENT_EXTENSION), period)
+                    if os.path.exists(writer.path):
+                        for s, e, a in iter_segment(writer.path):
+                            writer.add(datetime.datetime.fromisoformat(s), datetime.datetime.fromisoformat(e), a)
+                writer.add(start, end, activity['activity'])
+                archived[period] = archived.get(period, 0) + 1
+            hot.flush()
+            os.fsync(hot.fileno())
+
+        for writer in writers.values():
+            writer.finish()
+        for writer in writers.values():
+            writer.commit()
+        os.replace(tmp_path, log_path)
+
+        open_index(log_path).rebuild()
+        remove_overlap_index(log_path)
+    return archived
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("archive", "list") or (
+            sys.argv[1] == "archive" and len(sys.argv) > 4) or (
+            len(sys.argv) == 4 and sys.argv[3] not in ("year", "month")):
+        print("Usage: python segments.py archive <log file> [year|month]")
+        print("       python segments.py list <log file>")
+        sys.exit(1)
+    if sys.argv[1] == "archive":
+        granularity = sys.argv[3] if len(sys.argv) == 4 else "year"
+        archived = archive_log(sys.argv[2], granularity)
+        for period, count in sorted(archived.items()):
+            print(f"{period}: archived {count} sessions")
+        print(f"Archived {sum(archived.values())} sessions from {sys.argv[2]}")
+    else:
+        for path, header in SegmentSet(sys.argv[2]).segments:
+            hours = sum(header["totals"].values()) / 3600
+            print(f"{header['period']}: {header['count']} sessions, {hours:.1f} h, "
+                  f"{os.path.getsize(path)} bytes")
@@ -0,0 +1,178 @@
+"""Crash-safe checkpoint of the running timer session, and the pending queue.
+
+The checkpoint is a constant-size file of two fixed-size slots. Every update
+overwrites the older slot in place with a record carrying a sequence number
+and a CRC, so a write torn by a crash leaves the other slot intact and the
+file never grows or gets rewritten. On launch, load() returns the newest
+valid slot if it still describes a running session.
+
+Sessions that cannot be logged -- no category picked, an end before the
+start, a store that refused the write -- go to the pending queue, a small
+JSON-lines file next to the log, until the user fixes them.
+"""
+import collections
+import datetime
+import json
+import os
+import struct
+import zlib
+
+CHECKPOINT_SUFFIX = ".session"
+PENDING_SUFFIX = ".pending.jsonl"
+MAGIC = b"ATCK"
+CHECKPOINT_FORMAT = 1
+NO_CATEGORY = -1
+
+# magic, format, running, sequence, start, last checkpoint, category id; then CRC32
+_RECORD = struct.Struct("<4sHHQddi")
+_CRC = struct.Struct("<I")
+SLOT_SIZE = _RECORD.size + _CRC.size
+
+RunningSession = collections.namedtuple("RunningSession", "start saved category")
+
+
+def checkpoint_path_for(log_path, front_end):
+    """Checkpoint of one front-end's session on a log; each front-end runs its own."""
+    return f"{log_path}.{front_end}{CHECKPOINT_SUFFIX}"
+
+
+def pending_path_for(log_path):
+    return log_path + PENDING_SUFFIX
+
+
+class SessionCheckpoint:
+    """The running session of one front-end, kept in a two-slot file.
+
+    save() is a single in-place write of SLOT_SIZE bytes, cheap enough for a
+    heartbeat every few seconds; pass sync=True to also fsync, as start and
+    clear do. Categories are stored as registry ids (see category_registry.py).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self._file = None
+        self.load()
+
+    def load(self):
+        """Return the RunningSession left in the file, or None."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read(2 * SLOT_SIZE)
+        except FileNotFoundError:
+            return None
+        newest = None
+        for offset in range(0, len(data) - SLOT_SIZE + 1, SLOT_SIZE):
+            record = _unpack(data[offset:offset + SLOT_SIZE])
+            if record is not None and (newest is None or record[3] > newest[3]):
+                newest = record
+        if newest is None:
+            return None
+        _, _, running, seq, start, saved, category = newest
+        self.seq = max(self.seq, seq)
+        if not running:
+            return None
+        return RunningSession(datetime.datetime.fromtimestamp(start),
+                              datetime.datetime.fromtimestamp(saved),
+                              None if category == NO_CATEGORY else category)
+
+    def save(self, start, category=None, sync=False):
+        """Record that a session started at start is still running."""
+        self._write(True, start, category, sync)
+
+    def clear(self):
+        """Record that no session is running."""
+        self._write(False, None, None, True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, running, start, category, sync):
+        if self._file is None:
+            if not os.path.exists(self.path):
+                with open(self.path, "wb") as f:
+                    f.write(bytes(2 * SLOT_SIZE))
+            self._file = open(self.path, "r+b")
+        self.seq += 1
+        now = datetime.datetime.now().timestamp()
+        record = _RECORD.pack(MAGIC, CHECKPOINT_FORMAT, running, self.seq,
+                              start.timestamp() if start else 0.0, now,
+                              NO_CATEGORY if category is None else category)
+        self._file.seek((self.seq % 2) * SLOT_SIZE)
+        self._file.write(record + _CRC.pack(zlib.crc32(record)))
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+
+def _unpack(slot):
+    record, crc = slot[:_RECORD.size], slot[_RECORD.size:]
+    if _CRC.unpack(crc)[0] != zlib.crc32(record):
+        return None
+    fields = _RECORD.unpack(record)
+    if fields[0] != MAGIC or fields[1] != CHECKPOINT_FORMAT:
+        return None
+    return fields
+
+
+def validate_session(start, end, activity):
+    """Return why a session cannot be logged as it is, or None if it can."""
+    if not activity or not activity.strip():
+        return "no activity category was selected"
+    if end <= start:
+        return "it ends before it starts"
+    return None
+
+
+class PendingQueue:
+    """Sessions that could not be logged, kept until the user fixes them."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def add(self, start, end, activity, reason):
+        """Durably queue a session with the reason it was not logged."""
+        line = json.dumps({
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "activity": activity or "",
+            "reason": reason
+        }) + "\n"
+        with open(self.path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        """Return the queued sessions as dicts, oldest first."""
+        try:
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # a torn last line
+        return entries
+
+    def __len__(self):
+        return len(self.load())
+
+    def remove(self, entries):
+        """Drop entries from the queue, e.g. once they were logged or discarded."""
+        remaining = [e for e in self.load() if e not in entries]
+        if not remaining:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in remaining))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,167 @@
+import datetime
+import json
+import os
+import sqlite3
+from category_registry import CategoryRegistry, registry_path_for, resolve_totals
+from profiling import traced
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    activity TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions(end_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_activity ON sessions(activity, start_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_length ON sessions(end_time - start_time);
+"""
+
+
+def to_seconds(iso_text):
+    """Seconds since the epoch of a naive ISO timestamp, as stored in the table."""
+    return (datetime.datetime.fromisoformat(iso_text) - EPOCH).total_seconds()
+
+
+def from_seconds(seconds):
+    return (EPOCH + datetime.timedelta(seconds=seconds)).isoformat()
+
+
+class SQLiteStore:
+    """Activity store backed by an SQLite database in WAL mode.
+
+    Offers the same append/load/totals interface as the file stores in
+    activity_store, so both front-ends can share one database. Window totals
+    are computed by SQLite from a range search on the start index rather than
+    by scanning the history in Python.
+
+    Like the CSV log, and unlike the journal and the binary store, rows keep
+    the activity name rather than a registry id: databases written before the
+    registry stay readable by older front-ends, and names resolve through the
+    registry's aliases when totals and columns are read, so renames and merges
+    still apply to the whole history. Appends register new names in the
+    registry, so the category menus list them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.registry = CategoryRegistry(registry_path_for(path))
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def append(self, activity):
+        self.append_many([activity])
+
+    def append_many(self, activities):
+        rows = [(to_seconds(a['start_time']), to_seconds(a['end_time']), a['activity'])
+                for a in activities]
+        for name in {activity for _, _, activity in rows}:
+            self.registry.intern(name)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO sessions (start_time, end_time, activity) VALUES (?, ?, ?)", rows)
+
+    def __iter__(self):
+        rows = self.conn.execute(
+            "SELECT start_time, end_time, activity FROM sessions ORDER BY start_time")
+        for start, end, activity in rows:
+            yield {
+                "start_time": from_seconds(start),
+                "end_time": from_seconds(end),
+                "activity": activity
+            }
+
+    def load(self):
+        return list(self)
+
+    def version(self):
+        # Sessions are only ever appended, so the newest id identifies the data
+        return (self.conn.execute("SELECT MAX(id) FROM sessions").fetchone()[0],
+                self.registry.version())
+
+    def columns(self, since=None):
+        """Load the sessions still running at or after since into columns."""
+        import numpy as np
+        from analytics import SessionColumns
+        since_seconds = (since - EPOCH).total_seconds() if since else float("-inf")
+        self.registry.refresh()
+        rows = self.conn.execute(
+            "SELECT start_time, end_time, activity FROM sessions WHERE end_time > ?",
+            (since_seconds,)).fetchall()
+        rows = [(start, end, self.registry.display(activity)) for start, end, activity in rows]
+        categories = sorted({activity for _, _, activity in rows})
+        codes = {name: i for i, name in enumerate(categories)}
+        return SessionColumns(
+            np.array([int(start) for start, _, _ in rows], dtype=np.int64),
+            np.array([int(end) for _, end, _ in rows], dtype=np.int64),
+            np.array([codes[activity] for _, _, activity in rows], dtype=np.int32),
+            categories)
+
+    @traced("aggregate.sql_totals")
+    def window_totals(self, start_date, end_date):
+        """Hours per activity overlapping [start_date, end_date), clipped to it.
+
+        A session overlapping the window starts at most one session length
+        before it, so the longest session (read from the length index) bounds
+        start_time from below and the query is a range search on
+        idx_sessions_start instead of a scan.
+        """
+        since = (start_date - EPOCH).total_seconds()
+        until = (end_date - EPOCH).total_seconds()
+        longest = self.conn.execute(
+            "SELECT MAX(end_time - start_time) FROM sessions").fetchone()[0] or 0
+        rows = self.conn.execute(
+            """
+            SELECT activity, SUM(MIN(end_time, :until) - MAX(start_time, :since)) / 3600.0
+            FROM sessions
+            WHERE start_time >= :since - :longest AND start_time < :until AND end_time > :since
+            GROUP BY activity
+            """, {"since": since, "until": until, "longest": max(longest, 0)})
+        self.registry.refresh()
+        return resolve_totals({activity: hours for activity, hours in rows if hours}, self.registry)
+
+    def totals(self, days, today=None):
+        if today is None:
+            today = datetime.date.today()
+        first_day = today - datetime.timedelta(days=days - 1)
+        return self.window_totals(
+            datetime.datetime.combine(first_day, datetime.time()),
+            datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time()))
+
+
+def migrate_to_sqlite(log_path, db_path):
+    """Copy every session of a JSON, JSON-lines or CSV log into a database."""
+    store = SQLiteStore(db_path)
+    if log_path.endswith(".json"):
+        with open(log_path, "r") as f:
+            activities = json.load(f)
+    else:
+        from activity_store import open_store
+        activities = open_store(log_path)
+    before = store.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    store.append_many(activities)
+    after = store.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    store.close()
+    return after - before
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python sqlite_store.py <database> <log file> [<log file> ...]")
+        sys.exit(1)
+    for log_path in sys.argv[2:]:
+        if not os.path.exists(log_path):
+            print(f"Skipping missing {log_path}")
+            continue
+        count = migrate_to_sqlite(log_path, sys.argv[1])
+        print(f"Migrated {count} sessions from {log_path} to {sys.argv[1]}")
@@ -0,0 +1,315 @@
+import datetime
+import json
+import os
+import threading
+from log_reader import parse_line
+from profiling import span, traced
+
+INDEX_SUFFIX = ".idx.json"
+DELTA_SUFFIX = ".idx.delta"
+INDEX_VERSION = 1
+
+# Once the delta file outgrows this, the next refresh writes a new snapshot
+COMPACT_BYTES = 256 * 1024
+
+_open_indexes = {}
+_open_indexes_lock = threading.Lock()
+
+
+def index_path_for(log_path):
+    """Return the path of the rollup index kept next to a log file."""
+    return log_path + INDEX_SUFFIX
+
+
+def parse_log_line(line, is_csv, registry=None):
+    """Parse one raw log line into (start, end, activity), or None if invalid.
+
+    Journal records holding a category id are named through registry.
+    """
+    if is_csv:
+        return parse_line(line)
+    try:
+        record = json.loads(line)
+        start = datetime.datetime.fromisoformat(record['start_time'])
+        end = datetime.datetime.fromisoformat(record['end_time'])
+        if 'category' in record:
+            activity = registry.name(record['category'])
+        else:
+            activity = record['activity']
+    except (ValueError, KeyError, TypeError, IndexError, AttributeError):
+        return None
+    return start, end, activity
+
+
+def split_by_day(start, end):
+    """Yield (date, seconds) for each calendar day covered by a session."""
+    while start < end:
+        next_midnight = datetime.datetime.combine(
+            start.date() + datetime.timedelta(days=1), datetime.time())
+        chunk_end = min(end, next_midnight)
+        yield start.date(), (chunk_end - start).total_seconds()
+        start = chunk_end
+
+
+def merge_days(days, other):
+    """Add the {day: {activity: seconds}} buckets of other into days."""
+    for day, activities in other.items():
+        bucket = days.setdefault(day, {})
+        for activity, seconds in activities.items():
+            bucket[activity] = bucket.get(activity, 0) + seconds
+
+
+class DailyIndex:
+    """Persistent rollup of seconds spent per (day, category).
+
+    The index remembers how many bytes of the log it has consumed. Because the
+    logs are append-only, catching up after a new session only reads the new
+    lines, and a range query reads one bucket per day instead of the whole log.
+
+    On disk the index is a JSON snapshot plus a delta file of JSON lines, one
+    per refresh, holding the offsets it spans and the buckets it added. A
+    refresh only appends to the delta; the snapshot is rewritten once the
+    delta grows past COMPACT_BYTES, or by rebuild. A delta is applied only if
+    it starts where the index stands, so deltas left over from another
+    process or an older snapshot are skipped and their lines read from the
+    log again.
+    """
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.path = index_path_for(log_path)
+        self.delta_path = log_path + DELTA_SUFFIX
+        self.is_csv = log_path.endswith(".csv")
+        self.registry = None
+        self.offset = 0
+        self.days = {}
+        self.lock = threading.RLock()
+        self._snapshot = None    # stat of the snapshot we loaded or wrote
+        self._delta_read = 0     # bytes of the delta file applied so far
+        self.load()
+
+    @traced("load.index")
+    def load(self):
+        self.clear()
+        self._snapshot = _file_stamp(self.path)
+        self._delta_read = 0
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        if data.get("version") == INDEX_VERSION:
+            self.offset = data["offset"]
+            self.days = data["days"]
+        self.apply_deltas()
+
+    def apply_deltas(self):
+        """Fold in the deltas appended since we last looked, by any process."""
+        try:
+            f = open(self.delta_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size < self._delta_read:
+                self._delta_read = 0  # compacted and started over
+            f.seek(self._delta_read)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn append, the log still has those lines
+                self._delta_read += len(line)
+                try:
+                    delta = json.loads(line)
+                    if delta["from"] != self.offset:
+                        continue
+                    merge_days(self.days, delta["days"])
+                    self.offset = delta["to"]
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+
+    def save(self):
+        """Write a full snapshot and drop the deltas it now contains."""
+        # Unique temp name: the GUI may save from a stats worker thread too
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "offset": self.offset,
+                "days": self.days
+            }, f)
+        os.replace(tmp_path, self.path)
+        try:
+            os.remove(self.delta_path)
+        except FileNotFoundError:
+            pass
+        self._snapshot = _file_stamp(self.path)
+        self._delta_read = 0
+
+    def save_delta(self, first, days):
+        """Persist the buckets added for log bytes first..offset, compacting if due."""
+        line = json.dumps({"from": first, "to": self.offset, "days": days},
+                          separators=(",", ":")) + "\n"
+        with open(self.delta_path, "a") as f:
+            f.write(line)
+            size = f.tell()
+        if size >= COMPACT_BYTES:
+            self.save()
+        else:
+            self._delta_read = size
+
+    def clear(self):
+        self.offset = 0
+        self.days = {}
+
+    def add_session(self, start, end, activity, days=None):
+        days = self.days if days is None else days
+        for day, seconds in split_by_day(start, end):
+            bucket = days.setdefault(day.isoformat(), {})
+            bucket[activity] = bucket.get(activity, 0) + seconds
+
+    def is_consistent(self):
+        """Check that the consumed offset still lines up with the log."""
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return self.offset == 0
+        if self.offset > size:
+            return False
+        if self.offset == 0:
+            return True
+        with open(self.log_path, "rb") as f:
+            f.seek(self.offset - 1)
+            return f.read(1) == b"\n"
+
+    def sync(self):
+        """Pick up what other processes saved since we last looked."""
+        with self.lock:
+            if _file_stamp(self.path) != self._snapshot:
+                self.load()  # rebuilt or compacted elsewhere
+            else:
+                self.apply_deltas()
+
+    def refresh(self):
+        """Fold any lines appended since the last refresh into the index.
+
+        A missing or inconsistent index is rebuilt from scratch instead.
+        Returns the number of sessions added.
+        """
+        with self.lock:
+            self.sync()
+            if self.offset == 0 or not self.is_consistent():
+                return self.rebuild()
+            added = 0
+            try:
+                f = open(self.log_path, "rb")
+            except FileNotFoundError:
+                return 0
+            if not self.is_csv:
+                # Journal records may hold category ids registered since we last looked
+                if self.registry is None:
+                    from category_registry import CategoryRegistry, registry_path_for
+                    self.registry = CategoryRegistry(registry_path_for(self.log_path))
+                self.registry.refresh()
+            delta = {}
+            with f, span("load.index_refresh", path=self.log_path) as s:
+                f.seek(self.offset)
+                first = self.offset
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # incomplete last line, pick it up next time
+                    self.offset += len(line)
+                    session = parse_log_line(line, self.is_csv, self.registry)
+                    if session is None:
+                        continue
+                    self.add_session(*session, days=delta)
+                    added += 1
+                s.set(bytes=self.offset - first, records=added)
+            if self.offset != first:
+                merge_days(self.days, delta)
+                self.save_delta(first, delta)
+            return added
+
+    @traced("aggregate.index_rebuild", lambda added: {"records": added})
+    def rebuild(self, workers=None):
+        """Discard the index and rebuild it from the full log.
+
+        The log is loaded into columns and bucketed in one vectorized pass;
+        large CSV logs are split into chunks bucketed in parallel.
+        """
+        # These pull in numpy and are only needed here
+        from analytics import daily_buckets, load_columns
+        from parallel_reader import PARALLEL_THRESHOLD, parallel_daily_buckets
+        with self.lock:
+            self.clear()
+            if not os.path.exists(self.log_path):
+                added = 0
+            elif self.is_csv and (workers or os.path.getsize(self.log_path) >= PARALLEL_THRESHOLD):
+                added, self.offset, buckets = parallel_daily_buckets(self.log_path, workers)
+            else:
+                columns = load_columns(self.log_path)
+                added, self.offset, buckets = len(columns), columns.offset, daily_buckets(columns)
+            if added:
+                epoch = datetime.date(1970, 1, 1)
+                for (day_number, activity), seconds in buckets.items():
+                    day = (epoch + datetime.timedelta(days=day_number)).isoformat()
+                    self.days.setdefault(day, {})[activity] = seconds
+            self.save()
+            return added
+
+    @traced("aggregate.index_totals")
+    def totals(self, first_day, last_day):
+        """Return hours per activity for the days first_day..last_day inclusive."""
+        total_time = {}
+        day = first_day
+        with self.lock:
+            while day <= last_day:
+                for activity, seconds in self.days.get(day.isoformat(), {}).items():
+                    total_time[activity] = total_time.get(activity, 0) + seconds / 3600
+                day += datetime.timedelta(days=1)
+        return total_time
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def open_index(log_path):
+    """Return this process's DailyIndex for log_path, loading it on first use.
+
+    Keeping one index per log for the process lifetime means an append only
+    reads the new lines and appends a delta, instead of reloading the snapshot.
+    """
+    key = os.path.abspath(log_path)
+    with _open_indexes_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = _open_indexes[key] = DailyIndex(log_path)
+    return index
+
+
+def update_index(log_path):
+    """Bring the index for log_path up to date after a session was logged."""
+    return open_index(log_path).refresh()
+
+
+def query_totals(log_path, days, today=None):
+    """Return hours per activity over the last `days` calendar days (incl. today)."""
+    if today is None:
+        today = datetime.date.today()
+    index = open_index(log_path)
+    index.refresh()
+    return index.totals(today - datetime.timedelta(days=days - 1), today)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) not in (3, 4) or sys.argv[1] != "rebuild":
+        print("Usage: python stats_index.py rebuild <log file> [workers]")
+        sys.exit(1)
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else None
+    count = DailyIndex(sys.argv[2]).rebuild(workers)
+    print(f"Rebuilt index for {sys.argv[2]} from {count} sessions")
@@ -0,0 +1,16 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture
+def session():
+    """Build an activity dict from a start datetime and a length in minutes."""
+    def make(start, minutes, activity="Coding"):
+        end = start + datetime.timedelta(minutes=minutes)
+        return {"start_time": start.isoformat(), "end_time": end.isoformat(), "activity": activity}
+    return make
@@ -0,0 +1,39 @@
+import datetime
+
+from activity_store import ActivityJournal, CsvLog
+
+DAY = datetime.datetime(2024, 3, 4, 9)
+
+
+def test_journal_cuts_torn_last_record(tmp_path, session):
+    path = str(tmp_path / "log.jsonl")
+    journal = ActivityJournal(path)
+    journal.append_many([session(DAY, 60), session(DAY + datetime.timedelta(hours=2), 30, "Reading")])
+    with open(path, "ab") as f:
+        f.write(b'{"start_time":"2024-03-04T1')
+
+    reopened = ActivityJournal(path)
+    with open(path, "rb") as f:
+        assert f.read().endswith(b"}\n")
+    assert [a["activity"] for a in reopened.load()] == ["Coding", "Reading"]
+
+    reopened.append(session(DAY + datetime.timedelta(hours=4), 15))
+    assert len(reopened.load()) == 3
+
+
+def test_journal_stores_registry_ids(tmp_path, session):
+    path = str(tmp_path / "log.jsonl")
+    journal = ActivityJournal(path)
+    journal.append(session(DAY, 60, "Coding"))
+    with open(path) as f:
+        line = f.readline()
+    assert '"category":0' in line and "Coding" not in line
+    assert journal.load()[0]["activity"] == "Coding"
+
+
+def test_csv_totals_match_across_midnight(tmp_path, session):
+    log = CsvLog(str(tmp_path / "log.csv"))
+    log.append(session(datetime.datetime(2024, 3, 3, 23), 120))
+    log.append(session(datetime.datetime(2024, 3, 4, 9), 30, "Reading"))
+    assert log.totals(1, datetime.date(2024, 3, 4)) == {"Coding": 1.0, "Reading": 0.5}
+    assert log.totals(2, datetime.date(2024, 3, 4)) == {"Coding": 2.0, "Reading": 0.5}
@@ -0,0 +1,35 @@
+import pytest
+
+from category_registry import CategoryRegistry, resolve_totals
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = CategoryRegistry(str(tmp_path / "log.csv.categories.json"))
+    for name in ("Coding", "Reading", "Gaming"):
+        registry.intern(name)
+    return registry
+
+
+def test_ids_are_stable_and_lookups_ignore_case(registry):
+    assert registry.intern("coding ") == 0
+    assert registry.lookup("READING") == 1
+    assert registry.intern("Training") == 3
+
+
+def test_rename_keeps_the_old_name_as_alias(registry, tmp_path):
+    registry.rename("Coding", "Programming")
+    reloaded = CategoryRegistry(registry.path)
+    assert reloaded.name(0) == "Programming"
+    assert reloaded.display("coding") == "Programming"
+    with pytest.raises(ValueError):
+        reloaded.rename("Reading", "programming")
+
+
+def test_merge_counts_source_as_target(registry):
+    registry.merge("Gaming", "Reading")
+    assert registry.lookup("Gaming") == 1
+    assert registry.active() == ["Coding", "Reading"]
+    assert registry.labels() == ["Coding", "Reading", "Reading"]
+    assert resolve_totals({"Gaming": 1.0, "Reading": 2.0, "Coding": 0.5}, registry) == \
+        {"Reading": 3.0, "Coding": 0.5}
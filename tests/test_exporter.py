@@ -0,0 +1,47 @@
+import csv
+import datetime
+import os
+
+from activity_store import CsvLog
+from exporter import Exporter
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_incremental_export_only_adds_new_parts(tmp_path, session):
+    path = str(tmp_path / "log.csv")
+    out = str(tmp_path / "export")
+    log = CsvLog(path)
+    log.append(session(datetime.datetime(2024, 2, 10, 9), 60))
+    log.append(session(datetime.datetime(2024, 3, 4, 9), 30, "Reading"))
+
+    summary = Exporter(path, out, "csv").run()
+    assert (summary["full"], summary["records"], summary["exported"]) == (True, 2, 2)
+
+    log.append(session(datetime.datetime(2024, 3, 5, 9), 90, "Reading"))
+    summary = Exporter(path, out, "csv").run()
+    assert (summary["full"], summary["records"], summary["daily"]) == (False, 1, 1)
+
+    march = os.path.join(out, "sessions", "month=2024-03")
+    assert sorted(os.listdir(march)) == ["part-0000000000.csv", "part-0000000002.csv"]
+    daily = read_rows(os.path.join(out, "daily", "month=2024-03", "daily.csv"))
+    assert [(r["day"], r["activity"], float(r["hours"])) for r in daily] == [
+        ("2024-03-04", "Reading", 0.5), ("2024-03-05", "Reading", 1.5)]
+
+
+def test_rename_forces_a_full_export(tmp_path, session):
+    path = str(tmp_path / "log.csv")
+    out = str(tmp_path / "export")
+    log = CsvLog(path)
+    log.append(session(datetime.datetime(2024, 3, 4, 9), 30, "Reading"))
+    log.registry.intern("Reading")
+    Exporter(path, out, "csv").run()
+
+    log.registry.rename("Reading", "Books")
+    summary = Exporter(path, out, "csv").run()
+    assert summary["full"]
+    rows = read_rows(os.path.join(out, "sessions", "month=2024-03", "part-0000000000.csv"))
+    assert [r["activity"] for r in rows] == ["Books"]
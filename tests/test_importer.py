@@ -0,0 +1,60 @@
+import os
+
+import importer
+from activity_store import ActivityJournal
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_bad_rows_are_rejected_with_a_reason(tmp_path):
+    source = write(tmp_path / "in.csv",
+                   "start,end,activity\n"
+                   "2024-03-04 09:00,2024-03-04 10:00,coding\n"
+                   "2024-03-04 11:00,2024-03-04 10:00,Coding\n"
+                   "not a time,2024-03-04 10:00,Coding\n"
+                   "2024-03-04 09:00,2024-03-04 10:00,Knitting\n"
+                   "2024-03-04 09:00\n")
+    into = str(tmp_path / "log.csv")
+    imported, rejected = importer.import_files([source], into, {"coding": "Coding"})
+    assert imported == 1
+    assert [(line, reason) for _, line, reason, _ in rejected] == [
+        (3, "end is not after start"),
+        (4, "invalid timestamp"),
+        (5, "unknown category 'Knitting'"),
+        (6, "missing start or end"),
+    ]
+    with open(into) as f:
+        assert f.read() == "2024-03-04 09:00:00,2024-03-04 10:00:00,Coding\n"
+
+
+def test_journal_import_uses_the_registry(tmp_path):
+    into = str(tmp_path / "log.jsonl")
+    journal = ActivityJournal(into)
+    journal.append({"start_time": "2024-03-01T09:00:00", "end_time": "2024-03-01T10:00:00",
+                    "activity": "Reading"})
+    journal.registry.rename("Reading", "Books")
+    with open(into, "ab") as f:
+        f.write(b'{"start_ti')
+    source = write(tmp_path / "in.csv", "2024-03-04 09:00:00,2024-03-04 10:00:00,reading\n")
+
+    imported, rejected = importer.import_files([source], into, {})
+    assert (imported, rejected) == (1, [])
+    records = ActivityJournal(into).load()
+    assert [r["activity"] for r in records] == ["Books", "Books"]
+    with open(into) as f:
+        assert all('"category":0' in line for line in f)
+
+
+def test_rejects_file_of_an_earlier_run_is_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write(tmp_path / "categories.txt", "Coding\n")
+    write(tmp_path / "bad.csv", "2024-03-04 09:00:00,2024-03-04 10:00:00,Knitting\n")
+    write(tmp_path / "good.csv", "2024-03-04 09:00:00,2024-03-04 10:00:00,Coding\n")
+    assert importer.main(["--into", "log.csv", "bad.csv"]) == 0
+    assert os.path.exists("import_rejected.csv")
+    assert importer.main(["--into", "log.csv", "good.csv"]) == 0
+    assert not os.path.exists("import_rejected.csv")
@@ -0,0 +1,102 @@
+import datetime
+import os
+
+import overlap_index
+from activity_store import CsvLog
+from overlap_index import OverlapIndex, compact_log, compact_sessions, open_overlap_index
+
+T = datetime.datetime(2024, 3, 4, 9)
+
+
+def minutes(n):
+    return datetime.timedelta(minutes=n)
+
+
+def log_session(store, index, start, length, activity="Coding"):
+    index.sync()
+    store.append({"start_time": start.isoformat(),
+                  "end_time": (start + minutes(length)).isoformat(), "activity": activity})
+    index.add(start, start + minutes(length))
+
+
+def test_add_merges_overlapping_intervals(tmp_path):
+    store = CsvLog(str(tmp_path / "log.csv"))
+    index = open_overlap_index(store)
+    log_session(store, index, T, 30)
+    log_session(store, index, T + minutes(60), 30)
+    assert len(index.starts) == 2
+    log_session(store, index, T + minutes(20), 50)  # bridges both
+    assert len(index.starts) == 1
+    assert index.find(T + minutes(85), T + minutes(95)) == (T, T + minutes(90))
+    assert index.find(T + minutes(90), T + minutes(120)) is None
+
+
+def test_index_is_shared_and_reloaded_from_deltas(tmp_path):
+    store = CsvLog(str(tmp_path / "log.csv"))
+    index = open_overlap_index(store)
+    assert open_overlap_index(CsvLog(store.path)) is index
+    log_session(store, index, T, 30)
+    log_session(store, index, T + minutes(120), 30)
+    assert os.path.exists(store.path + overlap_index.INTERVALS_DELTA_SUFFIX)
+
+    fresh = OverlapIndex(CsvLog(store.path))
+    assert (fresh.starts, fresh.ends, fresh.version) == (index.starts, index.ends, index.version)
+
+
+def test_deltas_from_another_process_are_applied(tmp_path, monkeypatch):
+    store = CsvLog(str(tmp_path / "log.csv"))
+    index = OverlapIndex(store)
+    other = OverlapIndex(CsvLog(store.path))
+    log_session(store, other, T, 30)
+    rebuilds = []
+    monkeypatch.setattr(OverlapIndex, "_rebuild", lambda self, version: rebuilds.append(version))
+    assert index.check(T + minutes(10), T + minutes(20)) == (T, T + minutes(30))
+    assert rebuilds == []
+
+
+def test_compact_sessions_merges_per_activity():
+    sessions = [
+        (T, T + minutes(30), "Coding"),
+        (T + minutes(10), T + minutes(40), "Coding"),
+        (T + minutes(10), T + minutes(20), "Reading"),
+        (T, T + minutes(30), "Coding"),
+    ]
+    stats = {}
+    assert list(compact_sessions(sessions, stats=stats)) == [
+        (T, T + minutes(40), "Coding"),
+        (T + minutes(10), T + minutes(20), "Reading"),
+    ]
+    assert stats["merged"] == 2
+
+
+def test_compact_sessions_streams_past_a_rare_activity():
+    def sessions():
+        yield T, T + minutes(60), "Vacation"
+        for i in range(1, 2000):
+            start = T + datetime.timedelta(days=i)
+            yield start, start + minutes(30), "Coding"
+
+    read = []
+
+    def counted():
+        for s in sessions():
+            read.append(s)
+            yield s
+
+    first = next(compact_sessions(counted()))
+    assert first == (T, T + minutes(60), "Vacation")
+    assert len(read) < 100
+
+
+def test_compact_log_rewrites_the_log(tmp_path):
+    path = str(tmp_path / "log.csv")
+    with open(path, "w") as f:
+        f.write("2024-03-04 09:00:00,2024-03-04 10:00:00,Coding\n"
+                "2024-03-04 09:30:00,2024-03-04 11:00:00,Coding\n"
+                "2024-03-04 09:30:00,2024-03-04 10:00:00,Reading\n")
+    stats = compact_log(path)
+    assert stats["merged"] == 1
+    with open(path) as f:
+        assert f.read() == ("2024-03-04 09:00:00,2024-03-04 11:00:00,Coding\n"
+                            "2024-03-04 09:30:00,2024-03-04 10:00:00,Reading\n")
+    assert CsvLog(path).totals(1, T.date()) == {"Coding": 2.0, "Reading": 0.5}
@@ -0,0 +1,30 @@
+import datetime
+import os
+
+from activity_store import CsvLog
+from segments import SegmentSet, archive_log, segments_dir_for
+
+
+def test_archive_keeps_totals(tmp_path, session):
+    path = str(tmp_path / "log.csv")
+    log = CsvLog(path)
+    for year in (2022, 2023, 2024):
+        for day in range(0, 300, 7):
+            start = datetime.datetime(year, 1, 1, 9) + datetime.timedelta(days=day)
+            log.append(session(start, 90, "Coding" if day % 2 else "Reading"))
+    today = datetime.date(2024, 12, 31)
+    before = {days: log.totals(days, today) for days in (30, 400, 1200)}
+
+    archived = archive_log(path, "year", today)
+    assert set(archived) == {"2022", "2023"}
+    assert len(SegmentSet(path)) == 2
+    assert os.path.isdir(segments_dir_for(path))
+    with open(path) as f:
+        assert all(line.startswith("2024") for line in f)
+
+    after = CsvLog(path)
+    for days, totals in before.items():
+        result = after.totals(days, today)
+        assert result.keys() == totals.keys()
+        for activity, hours in totals.items():
+            assert abs(result[activity] - hours) < 1e-9
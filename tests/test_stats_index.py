@@ -0,0 +1,61 @@
+import datetime
+import json
+import os
+
+import stats_index
+from activity_store import CsvLog
+from stats_index import DailyIndex, open_index
+
+START = datetime.datetime(2024, 3, 4, 9)
+
+
+def fill(log, session, count, activity="Coding"):
+    for i in range(count):
+        log.append(session(START + datetime.timedelta(hours=i), 30, activity))
+
+
+def test_appends_go_to_the_delta(tmp_path, session):
+    path = str(tmp_path / "log.csv")
+    log = CsvLog(path)
+    fill(log, session, 3)
+    fill(log, session, 3, "Reading")
+    assert os.path.exists(path + stats_index.DELTA_SUFFIX)
+
+    # A new process sees the snapshot plus the deltas
+    fresh = DailyIndex(path)
+    assert fresh.offset == os.path.getsize(path)
+    assert fresh.days == open_index(path).days
+    assert fresh.totals(START.date(), START.date()) == {"Coding": 1.5, "Reading": 1.5}
+
+
+def test_delta_is_compacted_into_the_snapshot(tmp_path, session, monkeypatch):
+    monkeypatch.setattr(stats_index, "COMPACT_BYTES", 200)
+    path = str(tmp_path / "log.csv")
+    log = CsvLog(path)
+    fill(log, session, 10)
+    with open(path + stats_index.INDEX_SUFFIX) as f:
+        assert json.load(f)["offset"] > 0
+    delta = path + stats_index.DELTA_SUFFIX
+    assert not os.path.exists(delta) or os.path.getsize(delta) < 200
+    assert DailyIndex(path).totals(START.date(), START.date()) == {"Coding": 5.0}
+
+
+def test_stale_delta_is_skipped(tmp_path, session):
+    path = str(tmp_path / "log.csv")
+    log = CsvLog(path)
+    fill(log, session, 2)
+    # A delta that does not start where the snapshot ends must not count twice
+    with open(path + stats_index.DELTA_SUFFIX, "a") as f:
+        f.write('{"from":0,"to":10,"days":{"2024-03-04":{"Coding":99999}}}\n')
+    index = DailyIndex(path)
+    index.refresh()
+    assert index.totals(START.date(), START.date()) == {"Coding": 1.0}
+
+
+def test_rewritten_log_is_rebuilt(tmp_path, session):
+    path = str(tmp_path / "log.csv")
+    log = CsvLog(path)
+    fill(log, session, 4)
+    with open(path, "w") as f:
+        f.write("2024-03-04 09:00:00,2024-03-04 10:00:00,Reading\n")
+    assert stats_index.query_totals(path, 1, START.date()) == {"Reading": 1.0}